@@ -1,16 +1,42 @@
 import torch
 import numpy as np
+from .inference import compile_model
+
+
+def select_actions(q_values, legal, epsilon=0, generator=None):
+    # Маскированный argmax и epsilon-выбор среди свободных клеток для батча досок (N, cells)
+    q_values = q_values.masked_fill(~legal, float('-inf'))
+    actions = q_values.argmax(dim=1)
+    if epsilon > 0:
+        explore = torch.rand(len(actions), generator=generator) < epsilon
+        noise = torch.rand(q_values.shape, generator=generator).masked_fill(~legal, -1.0)
+        actions = torch.where(explore, noise.argmax(dim=1), actions)
+    return actions
+
 
 class AIAgent:
-    def __init__(self, model, epsilon=0):
+    def __init__(self, model, epsilon=0, cache=None, backend='numpy'):
         self.model = model
         self.epsilon = epsilon
+        self.cache = cache
+        # Сеть для вывода собирается при первом ходе, когда веса модели уже окончательные
+        self.backend = backend
+        self.net = None
 
     def get_action(self, board):
-        if np.random.random() < self.epsilon:
-            return np.random.choice(board.size * board.size)
+        return self.get_actions(np.asarray(board.get_state()).reshape(1, -1))[0].item()
+
+    def get_actions(self, states):
+        states = np.asarray(states, dtype=np.int8)
+        if self.cache is not None:
+            model_ids = np.zeros(len(states), dtype=np.int64)
+            q_values = self.cache.evaluate(lambda rows, boards: self.q_values(boards).numpy(), model_ids, states)
+            q_values = torch.from_numpy(q_values)
         else:
-            state = torch.FloatTensor(board.get_state())
-            with torch.no_grad():
-                q_values = self.model(state)
-            return q_values.argmax().item()
\ No newline at end of file
+            q_values = self.q_values(states)
+        return select_actions(q_values, torch.from_numpy(states == 0), self.epsilon)
+
+    def q_values(self, states):
+        if self.net is None:
+            self.net = compile_model(self.model, self.backend)
+        return self.net(states)
@@ -0,0 +1,76 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+DIRECTIONS = np.array([(0, 1), (1, 0), (1, 1), (1, -1)], dtype=np.int64)
+
+
+class BatchBoard:
+    # N партий в одном массиве (N, size, size); 0 - пусто, 1 - X, 2 - O
+    def __init__(self, n_games, size, win_line):
+        self.n_games = n_games
+        self.size = size
+        self.win_line = win_line
+        self.boards = np.zeros((n_games, size, size), dtype=np.int8)
+        self.moves = np.zeros(n_games, dtype=np.int64)
+        # Номера клеток по ходам для записи партий
+        self.history = np.zeros((n_games, size * size), dtype=np.uint8 if size * size <= 256 else np.int16)
+        # Смещения вдоль каждого направления от последнего хода: (4, 2 * win_line - 1, 2)
+        steps = np.arange(-(win_line - 1), win_line)
+        self.offsets = DIRECTIONS[:, None, :] * steps[None, :, None]
+
+    def get_states(self, games=None):
+        boards = self.boards if games is None else self.boards[games]
+        return boards.reshape(len(boards), -1)
+
+    def legal_mask(self, games=None):
+        return self.get_states(games) == 0
+
+    def is_full(self, games=None):
+        return ~self.legal_mask(games).any(axis=1)
+
+    def apply_moves(self, games, actions, player):
+        rows, cols = np.divmod(actions, self.size)
+        self.boards[games, rows, cols] = player
+        self.history[games, self.moves[games]] = actions
+        self.moves[games] += 1
+        return rows, cols
+
+    def check_last_moves(self, games, rows, cols, player):
+        # Проверяются только линии, проходящие через последний ход: O(win_line) на партию
+        r = rows[:, None, None] + self.offsets[None, :, :, 0]
+        c = cols[:, None, None] + self.offsets[None, :, :, 1]
+        inside = (r >= 0) & (r < self.size) & (c >= 0) & (c < self.size)
+        cells = self.boards[games[:, None, None], np.clip(r, 0, self.size - 1), np.clip(c, 0, self.size - 1)]
+        owned = inside & (cells == player)
+        runs = sliding_window_view(owned, self.win_line, axis=2).all(axis=3)
+        return runs.any(axis=(1, 2))
+
+    def check_winners(self, games=None):
+        # Полная проверка всех партий скользящими суммами; 0 - победителя нет
+        boards = self.boards if games is None else self.boards[games]
+        winners = np.zeros(len(boards), dtype=np.int8)
+        for player in (1, 2):
+            owned = (boards == player).astype(np.int8)
+            w = self.win_line
+            rows = sliding_window_view(owned, w, axis=2).sum(axis=3) == w
+            cols = sliding_window_view(owned, w, axis=1).sum(axis=3) == w
+            squares = sliding_window_view(owned, (w, w), axis=(1, 2))
+            diag = np.trace(squares, axis1=3, axis2=4) == w
+            anti = np.trace(squares[..., ::-1], axis1=3, axis2=4) == w
+            won = rows.any(axis=(1, 2)) | cols.any(axis=(1, 2)) | diag.any(axis=(1, 2)) | anti.any(axis=(1, 2))
+            winners[won & (winners == 0)] = player
+        return winners
+
+    def winning_line(self, game, row, col):
+        # Клетки выигрышной линии через ход (row, col) или None
+        player = self.boards[game, row, col]
+        for dr, dc in DIRECTIONS:
+            line = [(row, col)]
+            for sign in (1, -1):
+                r, c = row + sign * dr, col + sign * dc
+                while 0 <= r < self.size and 0 <= c < self.size and self.boards[game, r, c] == player:
+                    line.append((r, c))
+                    r, c = r + sign * dr, c + sign * dc
+            if len(line) >= self.win_line:
+                return sorted(line)
+        return None
@@ -0,0 +1,50 @@
+import glob
+import os
+import queue
+import threading
+import torch
+
+
+def checkpoint_dir(board_size, win_line):
+    return f'data/checkpoints/{board_size}x{board_size}_{win_line}_to_win'
+
+
+def latest_checkpoint(board_size, win_line):
+    paths = sorted(glob.glob(os.path.join(checkpoint_dir(board_size, win_line), 'generation_*.pt')))
+    return paths[-1] if paths else None
+
+
+def load_checkpoint(path):
+    return torch.load(path, weights_only=False)
+
+
+class CheckpointWriter:
+    # Снимки популяции сохраняются в фоновом потоке, обучение не ждёт диска
+    def __init__(self, board_size, win_line, keep_last=3):
+        self.path = checkpoint_dir(board_size, win_line)
+        self.keep_last = keep_last
+        os.makedirs(self.path, exist_ok=True)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def save(self, state):
+        # state должен быть уже скопирован: дальше обучение меняет геномы на месте
+        self.queue.put(state)
+
+    def _run(self):
+        while True:
+            state = self.queue.get()
+            if state is None:
+                self.queue.task_done()
+                return
+            path = os.path.join(self.path, f"generation_{state['generation']:06d}.pt")
+            torch.save(state, path + '.tmp')
+            os.replace(path + '.tmp', path)
+            for old in sorted(glob.glob(os.path.join(self.path, 'generation_*.pt')))[:-self.keep_last]:
+                os.remove(old)
+            self.queue.task_done()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,223 @@
+import copy
+import csv
+import os
+import random
+import time
+import numpy as np
+import torch
+import torch.nn.functional as F
+from .agents import select_actions
+from .batch_board import BatchBoard
+from .model_registry import ModelRegistry, model_filename
+from .neural_net import TicTacToeNet
+from .solver import Solver, table_path
+
+
+class ReplayBuffer:
+    # Кольцевой буфер переходов фиксированного размера: доски int8, ходы uint8
+    def __init__(self, capacity, cells):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, cells), dtype=np.int8)
+        self.actions = np.zeros(capacity, dtype=np.uint8 if cells <= 256 else np.int16)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, cells), dtype=np.int8)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        n = len(actions)
+        index = (self.position + np.arange(n)) % self.capacity
+        self.states[index] = states
+        self.actions[index] = actions
+        self.rewards[index] = rewards
+        self.next_states[index] = next_states
+        self.dones[index] = dones
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size, rng):
+        index = rng.integers(0, self.size, batch_size)
+        return self.states[index], self.actions[index], self.rewards[index], self.next_states[index], self.dones[index]
+
+
+class DQNTrainer:
+    # Самообучение сетей X и O по TD-ошибке вместо отбора по итогам партий.
+    # Переход стороны: её доска перед ходом -> её доска перед следующим ходом (после ответа соперника)
+    def __init__(self, board_size, win_line, games_per_batch=64, buffer_size=100000, batch_size=256,
+                 updates_per_batch=16, lr=1e-3, gamma=0.95, target_sync=200,
+                 epsilon_start=1.0, epsilon_end=0.05, epsilon_games=20000, eval_games=200, seed=None):
+        if seed is not None:
+            random.seed(seed)
+            torch.manual_seed(seed)
+        self.rng = np.random.default_rng(seed)
+        self.generator = torch.Generator().manual_seed(int(self.rng.integers(2 ** 63)))
+
+        self.board_size = board_size
+        self.win_line = win_line
+        self.cells = board_size * board_size
+        self.games_per_batch = games_per_batch
+        self.batch_size = batch_size
+        self.updates_per_batch = updates_per_batch
+        self.gamma = gamma
+        self.target_sync = target_sync
+        self.epsilon_start = epsilon_start
+        self.epsilon_end = epsilon_end
+        self.epsilon_games = epsilon_games
+        self.eval_games = eval_games
+
+        # Dropout в eval-режиме выключен, градиенты через LayerNorm при этом идут как обычно
+        self.models = {player: TicTacToeNet(board_size).eval() for player in (1, 2)}
+        self.targets = {player: copy.deepcopy(model) for player, model in self.models.items()}
+        self.optimizers = {player: torch.optim.Adam(model.parameters(), lr=lr) for player, model in self.models.items()}
+        self.buffers = {player: ReplayBuffer(buffer_size, self.cells) for player in (1, 2)}
+
+        self.games = 0
+        self.transitions = 0
+        self.updates = 0
+        path = table_path(board_size, win_line)
+        self.solver = Solver.load(board_size, win_line, path) if os.path.exists(path) else None
+
+    def epsilon(self):
+        progress = min(1.0, self.games / self.epsilon_games)
+        return self.epsilon_start + (self.epsilon_end - self.epsilon_start) * progress
+
+    def q_values(self, player, states):
+        with torch.no_grad():
+            return self.models[player](torch.from_numpy(states).float())
+
+    def play_batch(self, n_games):
+        board = BatchBoard(n_games, self.board_size, self.win_line)
+        active = np.ones(n_games, dtype=bool)
+        # Последний ход каждой стороны ждёт следующей позиции или конца партии
+        pending_states = {player: np.zeros((n_games, self.cells), dtype=np.int8) for player in (1, 2)}
+        pending_actions = {player: np.zeros(n_games, dtype=np.int64) for player in (1, 2)}
+        has_pending = {player: np.zeros(n_games, dtype=bool) for player in (1, 2)}
+        epsilon = self.epsilon()
+
+        for ply in range(self.cells):
+            if not active.any():
+                break
+            player, opponent = (1, 2) if ply % 2 == 0 else (2, 1)
+            games = np.flatnonzero(active)
+            states = board.get_states(games).copy()
+
+            # Позиция перед ходом завершает предыдущий переход этой стороны
+            waiting = has_pending[player][games]
+            self.store(player, pending_states[player][games[waiting]], pending_actions[player][games[waiting]],
+                       0.0, states[waiting], False)
+
+            actions = select_actions(self.q_values(player, states), torch.from_numpy(states == 0),
+                                     epsilon, self.generator).numpy()
+            rows, cols = board.apply_moves(games, actions, player)
+            pending_states[player][games] = states
+            pending_actions[player][games] = actions
+            has_pending[player][games] = True
+
+            won = board.check_last_moves(games, rows, cols, player)
+            full = board.is_full(games)
+            finished = won | full
+            if finished.any():
+                ended = games[finished]
+                final = board.get_states(ended)
+                reward = np.where(won[finished], 1.0, 0.0)
+                self.store(player, pending_states[player][ended], pending_actions[player][ended], reward, final, True)
+                # Проигравший получает -1 за свой последний ход
+                answered = has_pending[opponent][ended]
+                self.store(opponent, pending_states[opponent][ended[answered]], pending_actions[opponent][ended[answered]],
+                           -reward[answered], final[answered], True)
+                active[ended] = False
+        self.games += n_games
+
+    def store(self, player, states, actions, rewards, next_states, dones):
+        if len(actions):
+            rewards = np.broadcast_to(np.asarray(rewards, dtype=np.float32), len(actions))
+            self.buffers[player].add_batch(states, actions, rewards, next_states, np.broadcast_to(dones, len(actions)))
+            self.transitions += len(actions)
+
+    def update(self, player):
+        states, actions, rewards, next_states, dones = self.buffers[player].sample(self.batch_size, self.rng)
+        states = torch.from_numpy(states).float()
+        next_states_t = torch.from_numpy(next_states).float()
+        with torch.no_grad():
+            next_q = self.targets[player](next_states_t).masked_fill(torch.from_numpy(next_states != 0), float('-inf'))
+            next_value = torch.where(torch.from_numpy(dones), 0.0, next_q.max(dim=1).values)
+            target = torch.from_numpy(rewards) + self.gamma * next_value
+        q = self.models[player](states).gather(1, torch.from_numpy(actions.astype(np.int64))[:, None])[:, 0]
+        loss = F.smooth_l1_loss(q, target)
+        self.optimizers[player].zero_grad()
+        loss.backward()
+        self.optimizers[player].step()
+        return loss.item()
+
+    def train_step(self):
+        self.play_batch(self.games_per_batch)
+        losses = {1: [], 2: []}
+        for _ in range(self.updates_per_batch):
+            for player in (1, 2):
+                if len(self.buffers[player]) >= self.batch_size:
+                    losses[player].append(self.update(player))
+            self.updates += 1
+            if self.updates % self.target_sync == 0:
+                for player in (1, 2):
+                    self.targets[player].load_state_dict(self.models[player].state_dict())
+        return {player: float(np.mean(values)) if values else float('nan') for player, values in losses.items()}
+
+    def evaluate(self, player):
+        # Доля побед жадной сети против случайного соперника
+        n_games = self.eval_games
+        board = BatchBoard(n_games, self.board_size, self.win_line)
+        winners = np.zeros(n_games, dtype=np.int8)
+        active = np.ones(n_games, dtype=bool)
+        for ply in range(self.cells):
+            if not active.any():
+                break
+            mover = 1 if ply % 2 == 0 else 2
+            games = np.flatnonzero(active)
+            states = board.get_states(games)
+            legal = torch.from_numpy(states == 0)
+            if mover == player:
+                actions = select_actions(self.q_values(player, states), legal).numpy()
+            else:
+                actions = select_actions(torch.zeros(legal.shape), legal, 1.0, self.generator).numpy()
+            rows, cols = board.apply_moves(games, actions, mover)
+            won = board.check_last_moves(games, rows, cols, mover)
+            winners[games[won]] = mover
+            active[games[won | board.is_full(games)]] = False
+        return float((winners == player).mean())
+
+    def train(self, iterations, report_every=10):
+        os.makedirs('data/training_logs', exist_ok=True)
+        log_file = f'data/training_logs/dqn_log_{self.board_size}x{self.board_size}_{self.win_line}_to_win.csv'
+        start = time.perf_counter()
+        with open(log_file, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Iteration', 'Games', 'Transitions', 'Updates', 'Loss X', 'Loss O',
+                             'X Win Rate', 'O Win Rate', 'X Optimal', 'O Optimal', 'Seconds'])
+            for iteration in range(1, iterations + 1):
+                losses = self.train_step()
+                if iteration % report_every and iteration != iterations:
+                    continue
+                # Эффективность по числу сыгранных партий: сравнимо с партиями эволюционного Trainer
+                x_rate, o_rate = self.evaluate(1), self.evaluate(2)
+                x_optimal = o_optimal = float('nan')
+                if self.solver is not None:
+                    x_optimal = self.solver.optimal_move_fraction(self.models[1], 1, 2000)
+                    o_optimal = self.solver.optimal_move_fraction(self.models[2], 2, 2000)
+                elapsed = time.perf_counter() - start
+                writer.writerow([iteration, self.games, self.transitions, self.updates, losses[1], losses[2],
+                                 x_rate, o_rate, x_optimal, o_optimal, elapsed])
+                file.flush()
+                print(f"Iteration {iteration}: {self.games} games, {self.transitions} transitions, "
+                      f"loss X {losses[1]:.4f} O {losses[2]:.4f}, vs random: X wins {x_rate:.1%}, O wins {o_rate:.1%}"
+                      + (f", optimal moves X {x_optimal:.1%} O {o_optimal:.1%}" if self.solver is not None else "")
+                      + f", epsilon {self.epsilon():.2f}, {self.games / elapsed:.0f} games/s")
+
+        os.makedirs('data/saved_models', exist_ok=True)
+        registry = ModelRegistry('data/saved_models')
+        for player, name in ((1, 'X'), (2, 'O')):
+            torch.save(self.models[player].state_dict(), os.path.join('data/saved_models', model_filename(name, self.board_size, self.win_line)))
+            registry.register(name, self.board_size, self.win_line)
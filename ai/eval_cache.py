@@ -0,0 +1,103 @@
+from collections import OrderedDict
+import numpy as np
+
+# 3^39 ещё помещается в int64
+MAX_PACKED_CELLS = 39
+
+
+def symmetry_permutations(board_size):
+    # 8 симметрий квадрата: canonical[k] = state[perm[k]]
+    grid = np.arange(board_size * board_size).reshape(board_size, board_size)
+    perms = []
+    for k in range(4):
+        rotated = np.rot90(grid, k)
+        perms.append(rotated.flatten())
+        perms.append(np.fliplr(rotated).flatten())
+    return np.array(perms, dtype=np.int64)
+
+
+class EvaluationCache:
+    # LRU-кэш Q-значений по (id модели, каноническая доска)
+    def __init__(self, board_size, max_entries=100000, symmetry=True):
+        self.board_size = board_size
+        self.max_entries = max_entries
+        cells = board_size * board_size
+        self.packed = cells <= MAX_PACKED_CELLS
+        self.symmetry = symmetry and self.packed
+        if self.symmetry:
+            self.perms = symmetry_permutations(board_size)
+        else:
+            self.perms = np.arange(cells, dtype=np.int64)[None, :]
+        self.powers = 3 ** np.arange(cells, dtype=np.int64) if self.packed else None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def canonical(self, states):
+        # Возвращает ключи и номер симметрии, приводящей доску к канонической форме
+        if not self.packed:
+            return [state.tobytes() for state in states], np.zeros(len(states), dtype=np.int64)
+        variants = states[:, self.perms].astype(np.int64)  # (N, n_perms, cells)
+        keys = variants @ self.powers
+        transforms = keys.argmin(axis=1)
+        return keys[np.arange(len(states)), transforms].tolist(), transforms
+
+    def evaluate(self, forward, model_ids, states):
+        # forward(indices, canonical_states) -> Q-значения (M, cells) для канонических досок
+        keys, transforms = self.canonical(states)
+        perms = self.perms[transforms]
+        q_canonical = np.empty(states.shape, dtype=np.float32)
+
+        # Одинаковые позиции внутри батча считаются один раз
+        missing = {}
+        duplicates = []
+        for g, entry_key in enumerate(zip(model_ids.tolist(), keys)):
+            cached = self.entries.get(entry_key)
+            if cached is not None:
+                self.entries.move_to_end(entry_key)
+                q_canonical[g] = cached
+            elif entry_key in missing:
+                duplicates.append((g, missing[entry_key]))
+            else:
+                missing[entry_key] = g
+        self.hits += len(states) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            rows = np.array(list(missing.values()))
+            canonical_states = np.take_along_axis(states[rows], perms[rows], axis=1)
+            q_canonical[rows] = forward(rows, canonical_states)
+            for entry_key, g in missing.items():
+                self.store(entry_key, q_canonical[g].copy())
+            for g, source in duplicates:
+                q_canonical[g] = q_canonical[source]
+
+        q_values = np.empty_like(q_canonical)
+        np.put_along_axis(q_values, perms, q_canonical, axis=1)
+        return q_values
+
+    def store(self, key, q_values):
+        self.entries[key] = q_values
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def retain(self, model_ids):
+        # Убирает записи моделей, которых больше нет в популяции
+        alive = set(int(i) for i in model_ids)
+        for key in [key for key in self.entries if key[0] not in alive]:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+        }
@@ -0,0 +1,143 @@
+import os
+import queue
+import threading
+import numpy as np
+
+# Запись партии: заголовок + по одному байту (номер клетки) на ход; на доске 16x16 бывает 256 ходов
+HEADER_DTYPE = np.dtype([('board_size', 'u1'), ('win_line', 'u1'), ('result', 'u1'), ('n_moves', '<u2'),
+                         ('x_id', '<i8'), ('o_id', '<i8')])
+INDEX_DTYPE = np.dtype([('chunk', '<u4'), ('offset', '<u8')])
+MAX_CELLS = 256
+
+
+def chunk_path(path, chunk):
+    return os.path.join(path, f'games_{chunk:04d}.bin')
+
+
+class GameLogWriter:
+    # Append-only журнал партий; запись на диск идёт в фоновом потоке
+    def __init__(self, path='data/games', chunk_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.chunk_bytes = chunk_bytes
+        os.makedirs(path, exist_ok=True)
+        self.index_file = open(os.path.join(path, 'games.idx'), 'ab')
+        self.count = self.index_file.tell() // INDEX_DTYPE.itemsize
+
+        self.chunk = 0
+        while os.path.exists(chunk_path(path, self.chunk + 1)):
+            self.chunk += 1
+        self.chunk_file = open(chunk_path(path, self.chunk), 'ab')
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def append(self, board_size, win_line, result, moves, x_id=-1, o_id=-1):
+        self.append_batch(board_size, win_line, [result], [len(moves)], [moves], [x_id], [o_id])
+
+    def append_batch(self, board_size, win_line, results, n_moves, history, x_ids, o_ids):
+        # history: (N, cells) номера клеток по ходам; учитываются первые n_moves[i]
+        if board_size * board_size > MAX_CELLS:
+            raise ValueError(f"Board {board_size}x{board_size} does not fit one byte per move")
+        numbers = range(self.count + 1, self.count + len(results) + 1)
+        self.count += len(results)
+        self.queue.put((board_size, win_line, results, n_moves, history, x_ids, o_ids))
+        return numbers
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                self.queue.task_done()
+                return
+            self._write(*batch)
+            self.queue.task_done()
+
+    def _write(self, board_size, win_line, results, n_moves, history, x_ids, o_ids):
+        n_moves = np.asarray(n_moves, dtype=np.int64)
+        headers = np.zeros(len(n_moves), dtype=HEADER_DTYPE)
+        headers['board_size'] = board_size
+        headers['win_line'] = win_line
+        headers['result'] = results
+        headers['n_moves'] = n_moves
+        headers['x_id'] = x_ids
+        headers['o_id'] = o_ids
+
+        index = np.zeros(len(n_moves), dtype=INDEX_DTYPE)
+        records = []
+        offset = self.chunk_file.tell()
+        for g, length in enumerate(n_moves):
+            if offset >= self.chunk_bytes:
+                self.chunk_file.write(b''.join(records))
+                records = []
+                self.chunk_file.close()
+                self.chunk += 1
+                self.chunk_file = open(chunk_path(self.path, self.chunk), 'ab')
+                offset = 0
+            record = headers[g].tobytes() + np.asarray(history[g][:length], dtype=np.uint8).tobytes()
+            index[g] = (self.chunk, offset)
+            records.append(record)
+            offset += len(record)
+        self.chunk_file.write(b''.join(records))
+        self.chunk_file.flush()
+        # Индекс пишется после данных, поэтому читатель не увидит недописанную партию
+        self.index_file.write(index.tobytes())
+        self.index_file.flush()
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.chunk_file.close()
+        self.index_file.close()
+
+
+class GameLog:
+    # Чтение любой партии по номеру за O(1) через np.memmap
+    def __init__(self, path='data/games'):
+        self.path = path
+        index_path = os.path.join(path, 'games.idx')
+        # Пустой индекс остаётся, если обучение остановили до первой записи; memmap такой файл не открывает
+        if os.path.getsize(index_path):
+            self.index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r')
+        else:
+            self.index = np.zeros(0, dtype=INDEX_DTYPE)
+        self.chunks = {}
+
+    @staticmethod
+    def exists(path='data/games'):
+        return os.path.exists(os.path.join(path, 'games.idx'))
+
+    def __len__(self):
+        return len(self.index)
+
+    def read(self, number):
+        # Номера партий начинаются с 1
+        if not 1 <= number <= len(self.index):
+            raise IndexError(f"Game {number} is not in the log ({len(self.index)} games)")
+        chunk, offset = self.index[number - 1]
+        if chunk not in self.chunks:
+            self.chunks[chunk] = np.memmap(chunk_path(self.path, chunk), dtype=np.uint8, mode='r')
+        data = self.chunks[chunk]
+        start = int(offset) + HEADER_DTYPE.itemsize
+        header = data[int(offset):start].view(HEADER_DTYPE)[0]
+        return {
+            'board_size': int(header['board_size']),
+            'win_line': int(header['win_line']),
+            'result': int(header['result']),
+            'x_id': int(header['x_id']),
+            'o_id': int(header['o_id']),
+            'moves': np.array(data[start:start + int(header['n_moves'])]),
+        }
+
+    def read_moves(self, number):
+        # Формат прежних game_N.npy: строка 0 - результат, далее (row, col, player)
+        game = self.read(number)
+        rows, cols = np.divmod(game['moves'].astype(int), game['board_size'])
+        players = np.arange(len(rows)) % 2 + 1
+        moves = np.zeros((len(rows) + 1, 3), dtype=int)
+        moves[0, 0] = game['result']
+        moves[1:] = np.stack([rows, cols, players], axis=1)
+        return moves
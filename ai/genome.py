@@ -0,0 +1,64 @@
+import copy
+import torch
+import numpy as np
+from torch.nn.utils import parameters_to_vector
+from .neural_net import TicTacToeNet
+
+
+class Population:
+    # Вся популяция хранится в одном тензоре (population, n_params); модели - представления его строк
+    def __init__(self, board_size, size):
+        self.board_size = board_size
+        self.size = size
+        models = [TicTacToeNet(board_size) for _ in range(size)]
+
+        self.layout = [(name, p.shape, p.numel()) for name, p in models[0].named_parameters()]
+        self.segment_sizes = torch.tensor([numel for _, _, numel in self.layout])
+        self.n_params = int(self.segment_sizes.sum())
+
+        with torch.no_grad():
+            self.genomes = torch.stack([parameters_to_vector(m.parameters()) for m in models])
+        self.models = models
+        # Стабильные идентификаторы: строка с новым геномом получает новый id
+        self.ids = np.arange(size, dtype=np.int64)
+        self.next_id = size
+        for i, model in enumerate(models):
+            self.bind(model, i)
+            model.eval()
+
+    def bind(self, model, index):
+        # Параметры модели становятся представлениями строки genomes
+        for name, tensor in self.unflatten(self.genomes[index]).items():
+            model.get_parameter(name).data = tensor
+
+    def unflatten(self, vectors):
+        # (..., n_params) -> {name: (..., *shape)} без копирования
+        params = {}
+        offset = 0
+        for name, shape, numel in self.layout:
+            params[name] = vectors[..., offset:offset + numel].view(*vectors.shape[:-1], *shape)
+            offset += numel
+        return params
+
+    def new_ids(self, count):
+        ids = np.arange(self.next_id, self.next_id + count, dtype=np.int64)
+        self.next_id += count
+        return ids
+
+    def stacked(self, genomes=None):
+        # Состояние для PopulationForward прямо поверх genomes
+        base = copy.deepcopy(self.models[0]).to('meta')
+        base.eval()
+        return self.unflatten(self.genomes if genomes is None else genomes), {}, base
+
+    def expand_segments(self, values):
+        # (k, n_segments) -> (k, n_params): значение на тензор повторяется для всех его весов
+        return values.repeat_interleave(self.segment_sizes, dim=1)
+
+    def state_dict(self, index):
+        return {name: tensor.clone() for name, tensor in self.unflatten(self.genomes[index]).items()}
+
+    def load_state_dict(self, index, state_dict):
+        with torch.no_grad():
+            for name, tensor in self.unflatten(self.genomes[index]).items():
+                tensor.copy_(state_dict[name])
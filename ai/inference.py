@@ -0,0 +1,161 @@
+import copy
+import numpy as np
+import torch
+import torch.nn as nn
+
+# Варианты весов пониженной точности: int8 - динамическое квантование Linear, остальные - приведение типа
+PRECISIONS = ('int8', 'float16', 'bfloat16')
+
+
+def fuse_parameters(model):
+    # Центрирование LayerNorm линейно, поэтому переносится в веса предыдущего Linear:
+    # y - mean(y) = (W - mean_row(W)) x + (b - mean(b)); остаётся только деление на RMS
+    params = {}
+    for i, (fc, ln) in enumerate(((model.fc1, model.ln1), (model.fc2, model.ln2)), 1):
+        weight = fc.weight.detach().double()
+        bias = fc.bias.detach().double()
+        params[f'w{i}'] = (weight - weight.mean(dim=0, keepdim=True)).float()
+        params[f'b{i}'] = (bias - bias.mean()).float()
+        params[f'g{i}'] = ln.weight.detach().float().clone()
+        params[f'beta{i}'] = ln.bias.detach().float().clone()
+        params[f'eps{i}'] = ln.eps
+    params['w3'] = model.fc3.weight.detach().float().clone()
+    params['b3'] = model.fc3.bias.detach().float().clone()
+    return params
+
+
+class FusedNet(nn.Module):
+    # Только для вывода: без dropout, LayerNorm без вычитания среднего
+    def __init__(self, params):
+        super().__init__()
+        for name in ('w1', 'b1', 'g1', 'beta1', 'w2', 'b2', 'g2', 'beta2', 'w3', 'b3'):
+            self.register_buffer(name, params[name])
+        self.eps1 = float(params['eps1'])
+        self.eps2 = float(params['eps2'])
+
+    def forward(self, x):
+        x = torch.addmm(self.b1, x, self.w1.t())
+        x = torch.relu(x * torch.rsqrt(x.square().mean(dim=1, keepdim=True) + self.eps1) * self.g1 + self.beta1)
+        x = torch.addmm(self.b2, x, self.w2.t())
+        x = torch.relu(x * torch.rsqrt(x.square().mean(dim=1, keepdim=True) + self.eps2) * self.g2 + self.beta2)
+        return torch.addmm(self.b3, x, self.w3.t())
+
+
+class TorchInference:
+    def __init__(self, module, cells):
+        self.module = module
+        self.cells = cells
+
+    def __call__(self, states):
+        states = torch.as_tensor(np.asarray(states), dtype=torch.float32).reshape(-1, self.cells)
+        with torch.no_grad():
+            return self.module(states)
+
+
+class PrecisionInference(TorchInference):
+    # Вход приводится к типу весов, выход всегда float32
+    def __init__(self, module, cells, dtype=torch.float32):
+        super().__init__(module, cells)
+        self.dtype = dtype
+
+    def __call__(self, states):
+        states = torch.as_tensor(np.asarray(states)).to(self.dtype).reshape(-1, self.cells)
+        with torch.no_grad():
+            return self.module(states).float()
+
+
+def quantize_model(model, precision):
+    # Копия модели в режиме вывода; исходная модель не меняется
+    model = copy.deepcopy(model).eval()
+    if precision == 'int8':
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    if precision in ('float16', 'bfloat16'):
+        return model.to(getattr(torch, precision))
+    raise ValueError(f"Unknown precision: {precision}")
+
+
+def precision_dtype(precision):
+    return getattr(torch, precision) if precision in ('float16', 'bfloat16') else torch.float32
+
+
+class NumpyInference:
+    # Тот же расчёт на NumPy; промежуточные массивы выделяются один раз на каждый размер батча
+    max_buffers = 8
+
+    def __init__(self, params, cells):
+        self.cells = cells
+        for name, value in params.items():
+            if isinstance(value, torch.Tensor):
+                value = np.ascontiguousarray(value.numpy().T if name.startswith('w') else value.numpy())
+            setattr(self, name, value)
+        self.buffers = {}
+
+    def get_buffers(self, batch):
+        if batch not in self.buffers:
+            if len(self.buffers) >= self.max_buffers:
+                self.buffers.clear()
+            hidden = len(self.b1)
+            self.buffers[batch] = (np.empty((batch, self.cells), dtype=np.float32),
+                                   np.empty((batch, hidden), dtype=np.float32),
+                                   np.empty((batch, hidden), dtype=np.float32),
+                                   np.empty((batch, 1), dtype=np.float32))
+        return self.buffers[batch]
+
+    def layer(self, x, weight, bias, gain, beta, eps, out, norm):
+        np.matmul(x, weight, out=out)
+        out += bias
+        np.einsum('ij,ij->i', out, out, out=norm[:, 0])
+        norm *= 1.0 / out.shape[1]
+        norm += eps
+        np.sqrt(norm, out=norm)
+        out /= norm
+        out *= gain
+        out += beta
+        np.maximum(out, 0, out=out)
+
+    def __call__(self, states):
+        states = np.asarray(states).reshape(-1, self.cells)
+        x, h1, h2, norm = self.get_buffers(len(states))
+        x[:] = states
+        self.layer(x, self.w1, self.b1, self.g1, self.beta1, self.eps1, h1, norm)
+        self.layer(h1, self.w2, self.b2, self.g2, self.beta2, self.eps2, h2, norm)
+        # Результат - новый массив: вызывающий код может его хранить (например, в кэше оценок)
+        return torch.from_numpy(h2 @ self.w3 + self.b3)
+
+
+def check_against(model, compiled, samples=64, atol=1e-4):
+    cells = model.board_size * model.board_size
+    states = torch.randint(0, 3, (samples, cells), generator=torch.Generator().manual_seed(0))
+    training = model.training
+    model.eval()
+    with torch.no_grad():
+        expected = model(states.float())
+    model.train(training)
+    error = (compiled(states.numpy()) - expected).abs().max().item()
+    if error > atol:
+        raise RuntimeError(f"Compiled network differs from the eager model by {error:.2e}")
+    return error
+
+
+def compile_model(model, backend='numpy', check=True):
+    # backend: 'numpy' - быстрее всего для одиночных досок, 'jit' - TorchScript, 'compile' - torch.compile,
+    # 'eager' - сама модель без изменений, 'int8'/'float16'/'bfloat16' - веса пониженной точности
+    # (их расхождение с float32 не проверяется, его измеряет ai.quantize).
+    # Веса копируются: изменения модели после компиляции не видны
+    cells = model.board_size * model.board_size
+    if backend == 'eager':
+        return TorchInference(model.eval(), cells)
+    if backend in PRECISIONS:
+        return PrecisionInference(quantize_model(model, backend), cells, precision_dtype(backend))
+    params = fuse_parameters(model)
+    if backend == 'jit':
+        compiled = TorchInference(torch.jit.script(FusedNet(params)), cells)
+    elif backend == 'compile':
+        compiled = TorchInference(torch.compile(FusedNet(params), dynamic=True), cells)
+    elif backend == 'numpy':
+        compiled = NumpyInference(params, cells)
+    else:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if check:
+        check_against(model, compiled)
+    return compiled
@@ -0,0 +1,67 @@
+import cProfile
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Instrumentation:
+    # Накопительные таймеры и счётчики по фазам обучения; сбрасываются каждое поколение
+    def __init__(self):
+        self.timers = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def merge(self, snapshot):
+        for name, value in snapshot['timers'].items():
+            self.timers[name] += value
+        for name, value in snapshot['counters'].items():
+            self.counters[name] += value
+
+    def snapshot(self, reset=True):
+        snapshot = {'timers': dict(self.timers), 'counters': dict(self.counters)}
+        if reset:
+            self.timers.clear()
+            self.counters.clear()
+        return snapshot
+
+
+def generation_stats(generation, wall_time, snapshot):
+    timers, counters = snapshot['timers'], snapshot['counters']
+    return {
+        'generation': generation,
+        'wall_time': wall_time,
+        'games_per_sec': counters.get('games', 0) / wall_time if wall_time else 0.0,
+        'forward_passes_per_sec': counters.get('forward_passes', 0) / wall_time if wall_time else 0.0,
+        'timers': timers,
+        'counters': counters,
+    }
+
+
+def run_profiled(function, mode, path):
+    # mode: 'cprofile' - файл .prof для pstats/snakeviz, 'torch' - chrome trace от torch.profiler
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if mode == 'torch':
+        from torch.profiler import profile, ProfilerActivity
+
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as profiler:
+            result = function()
+        profiler.export_chrome_trace(path + '.json')
+        print(f"Torch profiler trace saved to {path}.json")
+        return result
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function)
+    profiler.dump_stats(path + '.prof')
+    print(f"cProfile stats saved to {path}.prof")
+    return result
@@ -0,0 +1,137 @@
+import os
+import queue
+import sys
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from .genome import Population
+from .tournament import Tournament, round_robin
+from .model_registry import ModelRegistry, model_filename
+from .solver import Solver
+from .trainer import Trainer
+
+
+def island_settings(island, islands):
+    # Острова отличаются жёсткостью отбора и силой мутаций: от мягкого отбора с сильными мутациями к жёсткому со слабыми
+    share = island / (islands - 1) if islands > 1 else 0.5
+    scale = 2.0 ** (1 - 2 * share)
+    return {
+        'x_threshold': 0.6 + 0.2 * share,
+        'o_threshold': 0.7 + 0.2 * share,
+        'weak_mutation_strength': 0.01 * scale,
+        'strong_mutation_strength': 0.1 * scale,
+    }
+
+
+def island_log_name(board_size, win_line, island):
+    return f'training_log_{board_size}x{board_size}_{win_line}_to_win_island{island}'
+
+
+def migrate(trainer, island, exchange, barrier, timeout):
+    # После эволюции лучшие модели стоят первыми: они копируются в общую память,
+    # а модели соседнего острова заменяют последних потомков
+    populations = (trainer.x_population, trainer.o_population)
+    migrants = exchange.shape[2]
+    with torch.no_grad():
+        for side, population in enumerate(populations):
+            exchange[island, side] = population.genomes[:migrants]
+    barrier.wait(timeout)
+    neighbour = (island - 1) % len(exchange)
+    with torch.no_grad():
+        for side, population in enumerate(populations):
+            population.genomes[-migrants:] = exchange[neighbour, side]
+            population.ids[-migrants:] = population.new_ids(migrants)
+    # Второй барьер: никто не пишет в обменник, пока соседи не прочитали
+    barrier.wait(timeout)
+
+
+def run_island(island, config, exchange, barrier, status):
+    # Отдельный процесс: свой Trainer, свои файлы журнала, обмен геномами через общую память
+    torch.set_num_threads(1)
+    islands = len(exchange)
+    log_name = island_log_name(config['board_size'], config['win_line'], island)
+    os.makedirs('data/training_logs', exist_ok=True)
+    sys.stdout = open(f'data/training_logs/{log_name}.out', 'w', buffering=1)
+
+    seed = None if config['seed'] is None else config['seed'] + island
+    trainer = Trainer(0, config['board_size'], config['win_line'], config['population'], seed=seed,
+                      record_games=False, scheduler=config['scheduler'], games_budget=config['games_budget'],
+                      log_name=log_name, **config['trainer'])
+    for name, value in island_settings(island, islands).items():
+        setattr(trainer, name, value)
+
+    def on_generation(trainer, generation):
+        if generation % config['migrate_every'] == 0 or generation == config['generations']:
+            status.put(('progress', island, generation, trainer.best_fitness))
+        if islands > 1 and generation % config['migrate_every'] == 0 and exchange.shape[2]:
+            migrate(trainer, island, exchange, barrier, config['timeout'])
+
+    trainer.train(config['generations'], config['rounds'], on_generation=on_generation, save_models=False)
+    status.put(('done', island, trainer.x_population.genomes[0].numpy().copy(), trainer.o_population.genomes[0].numpy().copy()))
+
+
+def train_islands(islands, board_size, win_line, population, generations, rounds, migrate_every=10, migrants=2,
+                  seed=None, scheduler='round-robin', games_budget=None, timeout=600, **trainer_options):
+    # trainer_options передаются Trainer каждого острова (cache_size, cache_symmetry, resample_rate,
+    # search_opponent, solver_eval). Острова - демон-процессы без своих пулов, поэтому workers=1,
+    # а журнал партий и контрольные точки общие на доску и с островами не ведутся
+    config = {'board_size': board_size, 'win_line': win_line, 'population': population, 'generations': generations,
+              'rounds': rounds, 'migrate_every': migrate_every, 'seed': seed,
+              'scheduler': scheduler, 'games_budget': games_budget, 'timeout': timeout, 'trainer': trainer_options}
+    if trainer_options.get('solver_eval'):
+        # Таблица решается один раз здесь, острова только читают её с диска
+        Solver.load_or_solve(board_size, win_line)
+    context = mp.get_context('spawn')
+    # Обменник мигрантов: (остров, X/O, мигрант, параметры) в общей памяти; двое лучших всегда остаются дома
+    migrants = max(0, min(migrants, population - 2))
+    exchange = torch.zeros(islands, 2, migrants, Population(board_size, 1).n_params).share_memory_()
+    barrier = context.Barrier(islands)
+    status = context.Queue()
+    processes = [context.Process(target=run_island, args=(island, config, exchange, barrier, status), daemon=True)
+                 for island in range(islands)]
+    for process in processes:
+        process.start()
+
+    x_best, o_best = [None] * islands, [None] * islands
+    finished = 0
+    while finished < islands:
+        try:
+            message = status.get(timeout=5)
+        except queue.Empty:
+            if not all(process.is_alive() for process in processes) and finished < islands:
+                failed = [i for i, process in enumerate(processes) if process.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"Islands {failed} failed, see data/training_logs/*_island*.out")
+            continue
+        if message[0] == 'progress':
+            _, island, generation, (x_fitness, o_fitness) = message
+            print(f"Island {island}: generation {generation}, best X {x_fitness:.2f}, best O {o_fitness:.2f}")
+        else:
+            _, island, x_genome, o_genome = message
+            x_best[island], o_best[island] = torch.from_numpy(x_genome), torch.from_numpy(o_genome)
+            finished += 1
+    for process in processes:
+        process.join()
+
+    # Лучшие модели островов играют между собой; сохраняются X и O с наибольшим числом побед
+    x_population = Population(board_size, islands)
+    o_population = Population(board_size, islands)
+    with torch.no_grad():
+        x_population.genomes.copy_(torch.stack(x_best))
+        o_population.genomes.copy_(torch.stack(o_best))
+    pairings = round_robin(islands, islands, rounds)
+    generator = torch.Generator()
+    if seed is not None:
+        generator.manual_seed(seed)
+    winners, _, _ = Tournament(board_size, win_line).play(x_population.models, o_population.models, pairings, generator)
+    x_wins = np.bincount(pairings[winners == 1, 0], minlength=islands)
+    o_wins = np.bincount(pairings[winners == 2, 1], minlength=islands)
+    best_x, best_o = int(np.argmax(x_wins)), int(np.argmax(o_wins))
+    print(f"Final tournament: best X from island {best_x} ({x_wins[best_x]} wins), "
+          f"best O from island {best_o} ({o_wins[best_o]} wins)")
+
+    os.makedirs('data/saved_models', exist_ok=True)
+    registry = ModelRegistry('data/saved_models')
+    for player, population, index in (('X', x_population, best_x), ('O', o_population, best_o)):
+        torch.save(population.state_dict(index), os.path.join('data/saved_models', model_filename(player, board_size, win_line)))
+        registry.register(player, board_size, win_line, generations)
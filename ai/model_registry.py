@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from .neural_net import TicTacToeNet
+
+MODEL_NAME = re.compile(r'model_(X|O)_(\d+)x\d+_(\d+)_to_win\.pth$')
+
+
+def model_filename(player, board_size, win_line):
+    return f'model_{player}_{board_size}x{board_size}_{win_line}_to_win.pth'
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    # Индекс сохранённых моделей (index.json) и LRU-кэш загруженных весов.
+    # Хэш считается только для новых или изменившихся файлов, поэтому запуск не читает сами веса
+    def __init__(self, path='data/saved_models', cache_size=4, mmap=True):
+        self.path = path
+        self.cache_size = cache_size
+        self.mmap = mmap
+        self.index_path = os.path.join(path, 'index.json')
+        self.entries = {}
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as file:
+                self.entries = json.load(file)
+
+    def scan(self):
+        changed = False
+        names = set(os.listdir(self.path)) if os.path.isdir(self.path) else set()
+        for name in list(self.entries):
+            if name not in names:
+                del self.entries[name]
+                changed = True
+        for name in sorted(names):
+            match = MODEL_NAME.match(name)
+            if match is None:
+                continue
+            stat = os.stat(os.path.join(self.path, name))
+            entry = self.entries.get(name)
+            if entry is not None and (entry['mtime'], entry['size']) == (stat.st_mtime, stat.st_size):
+                continue
+            # Файл появился или перезаписан не через register: generation и fitness неизвестны
+            player, board_size, win_line = match.group(1), int(match.group(2)), int(match.group(3))
+            self.entries[name] = self._entry(name, player, board_size, win_line, None, None)
+            changed = True
+        if changed:
+            self.save_index()
+        return self
+
+    def _entry(self, name, player, board_size, win_line, generation, fitness):
+        path = os.path.join(self.path, name)
+        stat = os.stat(path)
+        return {'player': player, 'board_size': board_size, 'win_line': win_line,
+                'generation': generation, 'fitness': fitness,
+                'sha256': file_hash(path), 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+    def save_index(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.index_path + '.tmp', 'w') as file:
+            json.dump(self.entries, file, indent=2, sort_keys=True)
+        os.replace(self.index_path + '.tmp', self.index_path)
+
+    def register(self, player, board_size, win_line, generation=None, fitness=None):
+        # Вызывается после сохранения весов, чтобы записать, откуда модель взялась
+        name = model_filename(player, board_size, win_line)
+        self.entries[name] = self._entry(name, player, board_size, win_line, generation, fitness)
+        self.save_index()
+        return self.entries[name]
+
+    def modes(self):
+        return sorted({(entry['board_size'], entry['win_line']) for entry in self.entries.values()})
+
+    def entry(self, player, board_size, win_line):
+        name = model_filename(player, board_size, win_line)
+        if name not in self.entries:
+            raise FileNotFoundError(os.path.join(self.path, name))
+        return self.entries[name]
+
+    def load(self, player, board_size, win_line):
+        entry = self.entry(player, board_size, win_line)
+        key = entry['sha256']
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        path = os.path.join(self.path, model_filename(player, board_size, win_line))
+        try:
+            state_dict = torch.load(path, mmap=self.mmap, weights_only=True)
+        except RuntimeError:
+            # Старый формат torch.save не поддерживает mmap
+            state_dict = torch.load(path, weights_only=True)
+        model = TicTacToeNet(board_size)
+        model.load_state_dict(state_dict)
+        model.eval()
+
+        with self.lock:
+            self.cache[key] = model
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return model
+
+    def load_pair(self, board_size, win_line):
+        return self.load('X', board_size, win_line), self.load('O', board_size, win_line)
+
+    def preload(self, board_size, win_line):
+        # Загрузка в фоне, пока пользователь выбирает режим; ошибки всплывут при load_pair
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        return self.executor.submit(self.load_pair, board_size, win_line)
@@ -0,0 +1,144 @@
+import io
+import os
+import time
+import numpy as np
+import torch
+from .agents import select_actions
+from .batch_board import BatchBoard
+from .inference import PRECISIONS, PrecisionInference, TorchInference, precision_dtype, quantize_model
+from .model_registry import model_filename
+from .neural_net import TicTacToeNet
+
+
+def quantized_path(player, board_size, win_line, precision, path='data/saved_models/quantized'):
+    # Отдельный каталог: реестр моделей смотрит только в data/saved_models
+    return os.path.join(path, model_filename(player, board_size, win_line)[:-len('.pth')] + f'.{precision}.pth')
+
+
+def export_model(model, precision, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save(quantize_model(model, precision).state_dict(), path)
+    return path
+
+
+def load_exported(path, board_size, precision):
+    # Модуль нужной структуры строится заново, затем в него грузятся сохранённые веса
+    module = quantize_model(TicTacToeNet(board_size), precision)
+    module.load_state_dict(torch.load(path))
+    return PrecisionInference(module, board_size * board_size, precision_dtype(precision))
+
+
+def state_size(state_dict):
+    # Размер весов так, как их сохраняет torch.save
+    buffer = io.BytesIO()
+    torch.save(state_dict, buffer)
+    return buffer.tell()
+
+
+def play_games(x_net, o_net, board_size, win_line, n_games, opening_moves=2, seed=0):
+    # Жадные партии батчем; первые opening_moves ходов случайные и при одном seed одинаковые для всех пар сетей
+    generator = torch.Generator().manual_seed(seed)
+    board = BatchBoard(n_games, board_size, win_line)
+    winners = np.zeros(n_games, dtype=np.int8)
+    active = np.ones(n_games, dtype=bool)
+    nets = {1: x_net, 2: o_net}
+    for ply in range(board_size * board_size):
+        if not active.any():
+            break
+        player = 1 if ply % 2 == 0 else 2
+        games = np.flatnonzero(active)
+        states = board.get_states(games)
+        legal = torch.from_numpy(states == 0)
+        if ply < opening_moves:
+            actions = select_actions(torch.zeros(legal.shape), legal, 1.0, generator).numpy()
+        else:
+            actions = select_actions(nets[player](states), legal).numpy()
+        rows, cols = board.apply_moves(games, actions, player)
+        won = board.check_last_moves(games, rows, cols, player)
+        winners[games[won]] = player
+        active[games[won | board.is_full(games)]] = False
+    return winners
+
+
+def random_positions(board_size, win_line, n_positions, seed=0):
+    # Незаконченные позиции случайных партий: все позиции перед ходом, затем случайная выборка
+    rng = np.random.default_rng(seed)
+    generator = torch.Generator().manual_seed(seed)
+    board = BatchBoard(n_positions, board_size, win_line)
+    active = np.ones(n_positions, dtype=bool)
+    seen = []
+    for ply in range(board_size * board_size):
+        if not active.any():
+            break
+        player = 1 if ply % 2 == 0 else 2
+        games = np.flatnonzero(active)
+        states = board.get_states(games).copy()
+        seen.append(states)
+        legal = torch.from_numpy(states == 0)
+        actions = select_actions(torch.zeros(legal.shape), legal, 1.0, generator).numpy()
+        rows, cols = board.apply_moves(games, actions, player)
+        won = board.check_last_moves(games, rows, cols, player)
+        active[games[won | board.is_full(games)]] = False
+    seen = np.concatenate(seen)
+    return seen[rng.choice(len(seen), min(n_positions, len(seen)), replace=False)]
+
+
+def move_agreement(reference, net, states):
+    legal = torch.from_numpy(states == 0)
+    expected = select_actions(reference(states), legal)
+    return float((select_actions(net(states), legal) == expected).float().mean())
+
+
+def move_latency(net, states, repeat=3):
+    # Время одного хода (одна доска, как в игре): лучший из repeat проходов, в микросекундах
+    legal = torch.from_numpy(states == 0)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for k in range(len(states)):
+            select_actions(net(states[k:k + 1]), legal[k:k + 1])
+        best = min(best, time.perf_counter() - start)
+    return best / len(states) * 1e6
+
+
+def evaluate_precisions(x_model, o_model, board_size, win_line, precisions=PRECISIONS, games=1000,
+                        positions=2000, latency_moves=500, seed=0, path='data/saved_models/quantized'):
+    # Каждый вариант экспортируется, загружается из файла и сравнивается с float32:
+    # совпадение исходов партий против float32-соперника, совпадение ходов, время хода и размер весов
+    cells = board_size * board_size
+    reference = {'X': TorchInference(x_model.eval(), cells), 'O': TorchInference(o_model.eval(), cells)}
+    baseline = play_games(reference['X'], reference['O'], board_size, win_line, games, seed=seed)
+    states = random_positions(board_size, win_line, positions, seed)
+    x_to_move = (states != 0).sum(axis=1) % 2 == 0
+    # Ходы сравниваются только в позициях, где ходит сторона модели
+    side_states = {'X': states[x_to_move], 'O': states[~x_to_move]}
+    rows = []
+
+    for precision in ('float32',) + tuple(precisions):
+        row = {'precision': precision}
+        for player, model in (('X', x_model), ('O', o_model)):
+            if precision == 'float32':
+                net = reference[player]
+                row[f'{player} size'] = state_size(model.state_dict())
+            else:
+                file = export_model(model, precision, quantized_path(player, board_size, win_line, precision, path))
+                net = load_exported(file, board_size, precision)
+                row[f'{player} size'] = os.path.getsize(file)
+            row[f'{player} latency'] = move_latency(net, side_states[player][:latency_moves])
+            row[f'{player} moves'] = move_agreement(reference[player], net, side_states[player])
+            if player == 'X':
+                winners = play_games(net, reference['O'], board_size, win_line, games, seed=seed)
+            else:
+                winners = play_games(reference['X'], net, board_size, win_line, games, seed=seed)
+            row[f'{player} games'] = float((winners == baseline).mean())
+            row[f'{player} win rate'] = float((winners == (1 if player == 'X' else 2)).mean())
+        rows.append(row)
+    return rows
+
+
+def print_report(rows):
+    print(f"{'precision':<10} {'player':<6} {'size KB':>8} {'us/move':>8} {'win rate':>9} {'same games':>11} {'same moves':>11}")
+    for row in rows:
+        for player in ('X', 'O'):
+            print(f"{row['precision']:<10} {player:<6} {row[f'{player} size'] / 1024:>8.1f} {row[f'{player} latency']:>8.1f} "
+                  f"{row[f'{player} win rate']:>9.1%} {row[f'{player} games']:>11.1%} {row[f'{player} moves']:>11.1%}")
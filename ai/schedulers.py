@@ -0,0 +1,121 @@
+import numpy as np
+from .tournament import round_robin
+
+
+class Scheduler:
+    # Выбирает пары (i, j) на один раунд; индексы >= размера популяции - соперники из зала славы
+    def __init__(self, budget=None):
+        self.budget = budget
+
+    def opponents_per_model(self, population_size, sides=1):
+        # Бюджет - число партий за раунд; sides=2, если соперников выбирают и X, и O
+        if self.budget is None:
+            return min(5, population_size)
+        return max(1, min(population_size, self.budget // (population_size * sides)))
+
+    def pairings(self, population_size, x_ratings, o_ratings, rng):
+        raise NotImplementedError
+
+    def hall_of_fame(self):
+        return [], []
+
+    def archive_size(self):
+        # Наибольшее число соперников из зала славы на каждую сторону
+        return 0
+
+    def record(self, x_population, o_population, x_scores, o_scores, generation):
+        pass
+
+    def state_dict(self):
+        return {}
+
+    def load_state_dict(self, state):
+        pass
+
+
+class RoundRobinScheduler(Scheduler):
+    # Все против всех; бюджет не используется
+    def pairings(self, population_size, x_ratings, o_ratings, rng):
+        return round_robin(population_size, population_size)
+
+
+class RandomOpponentsScheduler(Scheduler):
+    # Каждая модель играет с k случайными соперниками
+    def pairings(self, population_size, x_ratings, o_ratings, rng):
+        k = self.opponents_per_model(population_size, sides=2)
+        return sample_opponents(population_size, population_size, population_size, k, rng)
+
+
+class SwissScheduler(Scheduler):
+    # Модели близкого рейтинга играют между собой; новые модели получают случайное место
+    def pairings(self, population_size, x_ratings, o_ratings, rng):
+        k = self.opponents_per_model(population_size)
+        x_order = rank(x_ratings, rng)
+        o_order = rank(o_ratings, rng)
+        # Окно из k соседних мест не переходит через конец рейтинга: последние играют с последними, а не с лучшими
+        start = np.minimum(np.arange(population_size), population_size - k)
+        return np.stack([np.repeat(x_order, k), o_order[(start[:, None] + np.arange(k)).reshape(-1)]], axis=1)
+
+
+class HallOfFameScheduler(Scheduler):
+    # Соперники выбираются из текущей популяции и архива лучших моделей прошлых поколений
+    def __init__(self, budget=None, size=20, interval=5):
+        super().__init__(budget)
+        self.size = size
+        self.interval = interval
+        self.x_archive = []
+        self.o_archive = []
+
+    def pairings(self, population_size, x_ratings, o_ratings, rng):
+        k = self.opponents_per_model(population_size, sides=2)
+        return sample_opponents(population_size, population_size + len(self.o_archive),
+                                population_size + len(self.x_archive), k, rng)
+
+    def hall_of_fame(self):
+        return self.x_archive, self.o_archive
+
+    def archive_size(self):
+        return self.size
+
+    def record(self, x_population, o_population, x_scores, o_scores, generation):
+        if generation % self.interval:
+            return
+        for population, scores, archive in ((x_population, x_scores, self.x_archive),
+                                             (o_population, o_scores, self.o_archive)):
+            best = int(np.argmax(scores))
+            model_id = int(population.ids[best])
+            if all(model_id != archived_id for archived_id, _ in archive):
+                archive.append((model_id, population.genomes[best].clone()))
+            del archive[:-self.size]
+
+    def state_dict(self):
+        return {'x_archive': list(self.x_archive), 'o_archive': list(self.o_archive)}
+
+    def load_state_dict(self, state):
+        self.x_archive = list(state.get('x_archive', []))
+        self.o_archive = list(state.get('o_archive', []))
+
+
+def rank(ratings, rng):
+    # Лучшие модели первыми; у новых моделей рейтинга ещё нет, они встают на медиану
+    ratings = np.asarray(ratings, dtype=float)
+    known = ~np.isnan(ratings)
+    ratings = np.where(known, ratings, np.median(ratings[known]) if known.any() else 0.0)
+    return np.lexsort((rng.random(len(ratings)), -ratings))
+
+
+def sample_opponents(population_size, o_pool, x_pool, k, rng):
+    # Каждый X из популяции получает k соперников из o_pool, каждый O - k соперников из x_pool
+    x_side = np.stack([np.repeat(np.arange(population_size), k),
+                       np.concatenate([rng.choice(o_pool, size=k, replace=False) for _ in range(population_size)])], axis=1)
+    o_side = np.stack([np.concatenate([rng.choice(x_pool, size=k, replace=False) for _ in range(population_size)]),
+                       np.repeat(np.arange(population_size), k)], axis=1)
+    return np.unique(np.concatenate([x_side, o_side]), axis=0)
+
+
+SCHEDULERS = {
+    'round-robin': RoundRobinScheduler,
+    'swiss': SwissScheduler,
+    'random': RandomOpponentsScheduler,
+    'hall-of-fame': HallOfFameScheduler,
+}
@@ -0,0 +1,272 @@
+import time
+from functools import lru_cache
+import numpy as np
+from .batch_board import DIRECTIONS
+from .inference import compile_model
+
+# Победа оценивается выше любой оценки сети (|0.9 * tanh| < 1); быстрая победа лучше медленной
+WIN = 1.0
+EVAL_SCALE = 0.9
+
+
+@lru_cache(maxsize=None)
+def line_rays(size, win_line):
+    # Для каждой клетки и направления - клетки вперёд и назад, не дальше win_line - 1
+    rays = []
+    for cell in range(size * size):
+        row, col = divmod(cell, size)
+        cell_rays = []
+        for dr, dc in DIRECTIONS.tolist():
+            pair = []
+            for sign in (1, -1):
+                ray = []
+                for step in range(1, win_line):
+                    r, c = row + sign * step * dr, col + sign * step * dc
+                    if not (0 <= r < size and 0 <= c < size):
+                        break
+                    ray.append(r * size + c)
+                pair.append(tuple(ray))
+            cell_rays.append(tuple(pair))
+        rays.append(tuple(cell_rays))
+    return tuple(rays)
+
+
+@lru_cache(maxsize=None)
+def zobrist_table(cells):
+    rng = np.random.default_rng(cells)
+    return [[0] + rng.integers(1, 2 ** 63, size=2).tolist() for _ in range(cells)]
+
+
+class SearchBoard:
+    # Доска для перебора: список клеток, ход и откат за O(1), хэш Zobrist обновляется на каждом ходе
+    def __init__(self, size, win_line, cells=None):
+        self.size = size
+        self.win_line = win_line
+        self.n_cells = size * size
+        self.rays = line_rays(size, win_line)
+        self.zobrist = zobrist_table(self.n_cells)
+        self.grid = [0] * self.n_cells if cells is None else [int(value) for value in cells]
+        self.count = sum(1 for value in self.grid if value)
+        self.hash = 0
+        for cell, value in enumerate(self.grid):
+            self.hash ^= self.zobrist[cell][value]
+
+    @property
+    def board(self):
+        return np.array(self.grid, dtype=np.int8).reshape(self.size, self.size)
+
+    def get_state(self):
+        return np.array(self.grid, dtype=np.int8)
+
+    def player_to_move(self):
+        return 1 if self.count % 2 == 0 else 2
+
+    def empty_cells(self):
+        return [cell for cell, value in enumerate(self.grid) if not value]
+
+    def make(self, cell, player):
+        self.grid[cell] = player
+        self.hash ^= self.zobrist[cell][player]
+        self.count += 1
+
+    def unmake(self, cell, player):
+        self.grid[cell] = 0
+        self.hash ^= self.zobrist[cell][player]
+        self.count -= 1
+
+    def is_win(self, cell, player):
+        # Только линии через последний ход
+        grid = self.grid
+        for forward, backward in self.rays[cell]:
+            count = 1
+            for other in forward:
+                if grid[other] != player:
+                    break
+                count += 1
+            for other in backward:
+                if grid[other] != player:
+                    break
+                count += 1
+            if count >= self.win_line:
+                return True
+        return False
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class AlphaBetaAgent:
+    # Negamax с альфа-бета отсечением и итеративным углублением.
+    # Сеть упорядочивает ходы и оценивает листья (все дети узла глубины 1 - одним батчем);
+    # без модели агент ищет только форсированные победы и имеет фиксированную силу
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, model=None, win_line=None, max_depth=None, time_limit=None, tt_size=1_000_000, backend='numpy'):
+        self.model = model
+        self.win_line = win_line
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.tt_size = tt_size
+        self.net = compile_model(model, backend) if model is not None else None
+        self.table = {}
+        self.nodes = 0
+        self.value = None
+        self.depth_reached = 0
+        self.root_player = None
+
+    def get_action(self, board, stop=None):
+        # board - любая доска с атрибутом board (size x size); stop - threading.Event для отмены
+        cells = np.asarray(board.board).reshape(-1)
+        size = int(np.sqrt(len(cells)))
+        win_line = self.win_line or board.win_line
+        search_board = SearchBoard(size, win_line, cells)
+        if search_board.player_to_move() != self.root_player:
+            # Оценки в таблице даны с точки зрения прежней стороны
+            self.table.clear()
+        self.root_player = search_board.player_to_move()
+        self.stop = stop
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        self.nodes = 0
+        if len(self.table) > self.tt_size:
+            self.table.clear()
+
+        moves = search_board.empty_cells()
+        best_move = self.order(search_board, moves, self.root_player, None)[0]
+        max_depth = len(moves) if self.max_depth is None else min(self.max_depth, len(moves))
+        self.depth_reached = 0
+        for depth in range(1, max_depth + 1):
+            try:
+                value, move = self.search_root(search_board, depth)
+            except SearchTimeout:
+                break
+            best_move, self.value, self.depth_reached = move, value, depth
+            if abs(value) >= WIN:
+                # Исход форсирован, глубже искать незачем
+                break
+        return best_move
+
+    def search_root(self, board, depth):
+        player = self.root_player
+        entry = self.table.get(board.hash)
+        moves = self.order(board, board.empty_cells(), player, entry[3] if entry else None)
+        alpha, best_move = -np.inf, moves[0]
+        for move in moves:
+            value = self.child_value(board, move, player, depth, alpha, np.inf)
+            if value > alpha:
+                alpha, best_move = value, move
+        self.table[board.hash] = (depth, alpha, self.EXACT, best_move)
+        return alpha, best_move
+
+    def child_value(self, board, move, player, depth, alpha, beta):
+        board.make(move, player)
+        try:
+            if board.is_win(move, player):
+                return WIN + (board.n_cells - board.count) / board.n_cells
+            if board.count == board.n_cells:
+                return 0.0
+            return -self.negamax(board, depth - 1, -beta, -alpha, 3 - player)
+        finally:
+            board.unmake(move, player)
+
+    def negamax(self, board, depth, alpha, beta, player):
+        self.nodes += 1
+        if self.nodes & 63 == 0 and ((self.deadline and time.perf_counter() > self.deadline)
+                                      or (self.stop is not None and self.stop.is_set())):
+            raise SearchTimeout
+
+        original_alpha = alpha
+        entry = self.table.get(board.hash)
+        hint = None
+        if entry is not None:
+            entry_depth, value, flag, hint = entry
+            if entry_depth >= depth:
+                if flag == self.EXACT:
+                    return value
+                if flag == self.LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        if depth == 0:
+            return self.evaluate(board, [None], player)[0]
+
+        moves = board.empty_cells()
+        if depth == 1:
+            best, best_move = self.best_child(board, moves, player)
+        else:
+            best, best_move = -np.inf, None
+            for move in self.order(board, moves, player, hint):
+                value = self.child_value(board, move, player, depth, alpha, beta)
+                if value > best:
+                    best, best_move = value, move
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+
+        flag = self.UPPER if best <= original_alpha else self.LOWER if best >= beta else self.EXACT
+        self.table[board.hash] = (depth, best, flag, best_move)
+        return best
+
+    def best_child(self, board, moves, player):
+        # Узел глубины 1: победы и ничьи проверяются сразу, остальные дети оцениваются одним батчем
+        for move in moves:
+            board.make(move, player)
+            won = board.is_win(move, player)
+            board.unmake(move, player)
+            if won:
+                return WIN + (board.n_cells - board.count - 1) / board.n_cells, move
+        if board.count + 1 == board.n_cells:
+            return 0.0, moves[0]
+        values = -self.evaluate(board, moves, 3 - player, player)
+        best = int(np.argmax(values))
+        return float(values[best]), moves[best]
+
+    def encode(self, states, side):
+        # Сеть обучалась за сторону, ходящую в корне; позиции соперника подаются с переставленными X и O
+        if side != self.root_player:
+            states = np.where(states == 0, 0, 3 - states).astype(np.int8)
+        return states
+
+    def evaluate(self, board, moves, side, mover=None):
+        # Оценка позиций для стороны side: максимум Q по свободным клеткам; moves - ходы mover или [None]
+        if self.net is None:
+            return np.zeros(len(moves))
+        states = np.tile(np.array(board.grid, dtype=np.int8), (len(moves), 1))
+        for k, move in enumerate(moves):
+            if move is not None:
+                states[k, move] = mover
+        states = self.encode(states, side)
+        q_values = self.net(states).numpy()
+        q_values[states != 0] = -np.inf
+        return EVAL_SCALE * np.tanh(q_values.max(axis=1))
+
+    def order(self, board, moves, player, hint):
+        # Сначала лучший ход из таблицы, затем по Q сети (или ближе к центру без сети)
+        if self.net is not None:
+            q_values = self.net(self.encode(np.array(board.grid, dtype=np.int8)[None], player)).numpy()[0]
+            ordered = sorted(moves, key=lambda move: -q_values[move])
+        else:
+            center = (board.size - 1) / 2
+            ordered = sorted(moves, key=lambda move: abs(move // board.size - center) + abs(move % board.size - center))
+        if hint in moves:
+            ordered.remove(hint)
+            ordered.insert(0, hint)
+        return ordered
+
+
+def play_match(x_agent, o_agent, board_size, win_line):
+    # Одна партия между агентами с get_action(board) -> номер клетки; возвращает (победитель, число ходов)
+    board = SearchBoard(board_size, win_line)
+    agents = {1: x_agent, 2: o_agent}
+    while board.count < board.n_cells:
+        player = board.player_to_move()
+        move = int(agents[player].get_action(board))
+        if board.grid[move]:
+            raise ValueError(f"Agent chose an occupied cell {move}")
+        board.make(move, player)
+        if board.is_win(move, player):
+            return player, board.count
+    return 0, board.count
@@ -0,0 +1,178 @@
+import os
+import sys
+import numpy as np
+from .batch_board import BatchBoard
+from .eval_cache import symmetry_permutations
+from .inference import compile_model
+from .search import SearchBoard
+
+# Полный перебор реален только для маленьких досок: 4x4 - около миллиона позиций с точностью до симметрии
+MAX_SOLVER_CELLS = 16
+
+
+def table_path(board_size, win_line):
+    return f'data/solver/{board_size}x{board_size}_{win_line}_to_win.npz'
+
+
+def sign(values):
+    return np.sign(values).astype(np.int8)
+
+
+class Solver:
+    # Точные оценки всех достижимых незаконченных позиций для стороны, которая ходит:
+    # +(1 + пустые клетки после последнего хода) - победа, 0 - ничья, отрицательные - поражение.
+    # Ключ - минимальная упаковка по основанию 3 среди 8 симметрий доски
+    def __init__(self, board_size, win_line):
+        if board_size * board_size > MAX_SOLVER_CELLS:
+            raise ValueError(f"Board {board_size}x{board_size} is too large to solve exactly")
+        self.board_size = board_size
+        self.win_line = win_line
+        self.cells = board_size * board_size
+        self.perms = symmetry_permutations(board_size)
+        self.powers = 3 ** np.arange(self.cells, dtype=np.int64)
+        self.keys = None
+        self.values = None
+
+    def solve(self):
+        # Negamax с запоминанием; ключи 8 симметрий обновляются на каждом ходе, а не пересчитываются
+        inverse = np.argsort(self.perms, axis=1)
+        weights = [[int(3 ** inverse[k, cell]) for k in range(len(self.perms))] for cell in range(self.cells)]
+        board = SearchBoard(self.board_size, self.win_line)
+        keys = [0] * len(self.perms)
+        table = {}
+
+        def negamax(player):
+            key = min(keys)
+            value = table.get(key)
+            if value is not None:
+                return value
+            best = -self.cells - 1
+            for cell in range(self.cells):
+                if board.grid[cell]:
+                    continue
+                board.make(cell, player)
+                for k, weight in enumerate(weights[cell]):
+                    keys[k] += player * weight
+                if board.is_win(cell, player):
+                    value = 1 + self.cells - board.count
+                elif board.count == self.cells:
+                    value = 0
+                else:
+                    value = -negamax(3 - player)
+                for k, weight in enumerate(weights[cell]):
+                    keys[k] -= player * weight
+                board.unmake(cell, player)
+                best = max(best, value)
+            table[key] = best
+            return best
+
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, 10 * self.cells))
+        try:
+            negamax(1)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+        self.keys = np.fromiter(table.keys(), dtype=np.int64, count=len(table))
+        self.values = np.fromiter(table.values(), dtype=np.int8, count=len(table))
+        order = np.argsort(self.keys)
+        self.keys, self.values = self.keys[order], self.values[order]
+        return self
+
+    def save(self, path=None):
+        path = path or table_path(self.board_size, self.win_line)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, keys=self.keys, values=self.values, board_size=self.board_size, win_line=self.win_line)
+        return path
+
+    @classmethod
+    def load(cls, board_size, win_line, path=None):
+        data = np.load(path or table_path(board_size, win_line))
+        solver = cls(board_size, win_line)
+        solver.keys, solver.values = data['keys'], data['values']
+        return solver
+
+    @classmethod
+    def load_or_solve(cls, board_size, win_line):
+        path = table_path(board_size, win_line)
+        if os.path.exists(path):
+            return cls.load(board_size, win_line, path)
+        solver = cls(board_size, win_line).solve()
+        solver.save(path)
+        return solver
+
+    def canonical(self, states):
+        return (states[:, self.perms].astype(np.int64) @ self.powers).min(axis=1)
+
+    def lookup(self, states):
+        # Оценки незаконченных позиций (N, cells) для стороны, которая ходит
+        keys = self.canonical(np.asarray(states).reshape(-1, self.cells))
+        index = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        if not (self.keys[index] == keys).all():
+            raise KeyError("Position is not reachable or already finished")
+        return self.values[index]
+
+    def move_values(self, states, actions):
+        # Оценка хода actions в позициях states для сделавшего его игрока; учитывает победу и ничью после хода
+        states = np.array(states, dtype=np.int8).reshape(-1, self.cells)
+        actions = np.asarray(actions, dtype=np.int64)
+        games = np.arange(len(states))
+        players = np.where((states != 0).sum(axis=1) % 2 == 0, 1, 2).astype(np.int8)
+        board = BatchBoard(len(states), self.board_size, self.win_line)
+        board.boards[:] = states.reshape(-1, self.board_size, self.board_size)
+        rows, cols = np.divmod(actions, self.board_size)
+        board.boards[games, rows, cols] = players
+        won = np.zeros(len(states), dtype=bool)
+        for player in (1, 2):
+            mine = players == player
+            won[mine] = board.check_last_moves(games[mine], rows[mine], cols[mine], player)
+        children = board.get_states()
+        empty = self.cells - (children != 0).sum(axis=1)
+        values = np.zeros(len(states), dtype=np.int64)
+        values[won] = 1 + empty[won]
+        ongoing = ~won & (empty > 0)
+        if ongoing.any():
+            values[ongoing] = -self.lookup(children[ongoing]).astype(np.int64)
+        return values
+
+    def best_moves(self, state):
+        state = np.asarray(state, dtype=np.int8).reshape(-1)
+        moves = np.flatnonzero(state == 0)
+        values = self.move_values(np.tile(state, (len(moves), 1)), moves)
+        return moves[values == values.max()], values
+
+    def positions(self, player=None):
+        # Все незаконченные позиции таблицы (канонические) и их оценки; player - только позиции, где ходит он
+        states = (self.keys[:, None] // self.powers[None, :] % 3).astype(np.int8)
+        values = self.values
+        if player is not None:
+            mine = np.where((states != 0).sum(axis=1) % 2 == 0, 1, 2) == player
+            states, values = states[mine], values[mine]
+        return states, values
+
+    def optimal_move_fraction(self, model, player, samples=None, seed=0, batch=4096):
+        # Доля позиций, где жадный ход модели сохраняет теоретический исход (победа/ничья/поражение)
+        states, values = self.positions(player)
+        if samples is not None and samples < len(states):
+            chosen = np.random.default_rng(seed).choice(len(states), samples, replace=False)
+            states, values = states[chosen], values[chosen]
+        net = compile_model(model)
+        optimal = 0
+        for start in range(0, len(states), batch):
+            part = states[start:start + batch]
+            q_values = net(part).numpy()
+            q_values[part != 0] = -np.inf
+            chosen_values = self.move_values(part, q_values.argmax(axis=1))
+            optimal += int((sign(chosen_values) == sign(values[start:start + batch])).sum())
+        return optimal / len(states)
+
+
+class PerfectAgent:
+    # Идеальный игрок по таблице решателя; среди равных ходов выбирает случайный
+    def __init__(self, solver, seed=None):
+        self.solver = solver
+        self.rng = np.random.default_rng(seed)
+
+    def get_action(self, board):
+        state = np.asarray(board.board if hasattr(board, 'board') else board.get_state()).reshape(-1)
+        moves, _ = self.solver.best_moves(state)
+        return int(self.rng.choice(moves))
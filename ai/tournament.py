@@ -0,0 +1,225 @@
+import copy
+import torch
+import torch.multiprocessing as mp
+import numpy as np
+from torch.func import functional_call, vmap
+from .batch_board import BatchBoard
+from .agents import select_actions
+from .eval_cache import EvaluationCache
+from .instrumentation import Instrumentation
+
+
+def round_robin(population_x, population_o, rounds=1):
+    pairs = [(i, j) for i in range(population_x) for j in range(population_o)]
+    return np.array(pairs * rounds, dtype=np.int64).reshape(-1, 2)
+
+
+def stack_models(models):
+    with torch.no_grad():
+        params = {name: torch.stack([dict(m.named_parameters())[name] for m in models])
+                  for name, _ in models[0].named_parameters()}
+        buffers = {name: torch.stack([dict(m.named_buffers())[name] for m in models])
+                   for name, _ in models[0].named_buffers()}
+    base = copy.deepcopy(models[0]).to('meta')
+    base.eval()
+    return params, buffers, base
+
+
+class PopulationForward:
+    # Один вызов vmap на всю популяцию вместо отдельного forward на каждую партию
+    def __init__(self, params, buffers, base):
+        self.params = params
+        self.buffers = buffers
+        self.base = base
+        self.population_size = len(next(iter(params.values())))
+
+        def call(params, buffers, x):
+            return functional_call(self.base, (params, buffers), (x,))
+
+        self.forward = vmap(call)
+
+    @classmethod
+    def from_models(cls, models):
+        return cls(*stack_models(models))
+
+    def __call__(self, model_idx, states):
+        # states: (N, cells); каждая партия кладётся в слот своей модели
+        slots = torch.from_numpy(group_slots(model_idx))
+        model_idx = torch.from_numpy(model_idx)
+        per_model = int(slots.max()) + 1 if len(slots) else 1
+        padded = torch.zeros(self.population_size, per_model, states.shape[1])
+        padded[model_idx, slots] = states
+        with torch.no_grad():
+            q_values = self.forward(self.params, self.buffers, padded)
+        return q_values[model_idx, slots]
+
+
+def group_slots(model_idx):
+    # Порядковый номер партии среди партий той же модели
+    order = np.argsort(model_idx, kind='stable')
+    sorted_idx = model_idx[order]
+    slots = np.empty(len(model_idx), dtype=np.int64)
+    slots[order] = np.arange(len(model_idx)) - np.searchsorted(sorted_idx, sorted_idx, side='left')
+    return slots
+
+
+def make_generator(seed_sequence):
+    return torch.Generator().manual_seed(int(seed_sequence.generate_state(1, dtype=np.uint64)[0]))
+
+
+_worker = {}
+
+
+def _init_worker(config, x_state, o_state):
+    # Веса приходят один раз через разделяемую память и дальше обновляются на месте
+    torch.set_num_threads(1)
+    _worker['tournament'] = Tournament(*config)
+    _worker['x'] = PopulationForward(*x_state)
+    _worker['o'] = PopulationForward(*o_state)
+
+
+def _play_chunk(task):
+    pairings, seed, ids = task
+    tournament = _worker['tournament']
+    tournament.retain(ids)
+    before = tournament.cache_counts()
+    winners, moves, history = tournament.play_stacked(_worker['x'], _worker['o'], pairings, make_generator(seed), ids)
+    return winners, moves, history, tournament.cache_counts() - before, tournament.stats.snapshot()
+
+
+class Tournament:
+    def __init__(self, board_size, win_line, epsilon=0.05, workers=1, cache_size=0, cache_symmetry=True):
+        self.board_size = board_size
+        self.win_line = win_line
+        self.epsilon = epsilon
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache_symmetry = cache_symmetry
+        self.pool = None
+        self.shared = None
+
+        # Отдельный кэш оценок для популяций X и O
+        self.caches = {player: EvaluationCache(board_size, cache_size, cache_symmetry) if cache_size else None
+                       for player in (1, 2)}
+        self.cache_totals = np.zeros(2, dtype=np.int64)
+        # Время в процессах-исполнителях суммируется по всем процессам
+        self.stats = Instrumentation()
+
+    def play(self, x_models, o_models, pairings, generator=None):
+        return self.play_stacked(PopulationForward.from_models(x_models), PopulationForward.from_models(o_models),
+                                 pairings, generator)
+
+    def play_chunks(self, x_state, o_state, chunks, seed, ids=None):
+        # Каждый блок партий получает своё зерно, поэтому результат не зависит от числа процессов
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        if self.workers <= 1:
+            x_forward = PopulationForward(*x_state)
+            o_forward = PopulationForward(*o_state)
+            self.retain(ids)
+            before = self.cache_counts()
+            results = [self.play_stacked(x_forward, o_forward, chunk, make_generator(s), ids)
+                       for chunk, s in zip(chunks, seeds)]
+            self.cache_totals += self.cache_counts() - before
+        else:
+            self.share_states(x_state, o_state)
+            results = self.pool.map(_play_chunk, [(chunk, s, ids) for chunk, s in zip(chunks, seeds)])
+            for result in results:
+                self.cache_totals += result[3]
+                self.stats.merge(result[4])
+        winners = np.concatenate([result[0] for result in results])
+        moves = np.concatenate([result[1] for result in results])
+        history = np.concatenate([result[2] for result in results])
+        return winners, moves, history
+
+    def retain(self, ids):
+        if ids is None:
+            return
+        for player, model_ids in zip((1, 2), ids):
+            if self.caches[player] is not None:
+                self.caches[player].retain(model_ids)
+
+    def cache_counts(self):
+        counts = np.zeros(2, dtype=np.int64)
+        for cache in self.caches.values():
+            if cache is not None:
+                counts += (cache.hits, cache.misses)
+        return counts
+
+    def cache_stats(self):
+        hits, misses = self.cache_totals
+        total = hits + misses
+        return {'hits': int(hits), 'misses': int(misses), 'hit_rate': hits / total if total else 0.0}
+
+    def evaluate(self, player, forward, model_idx, model_ids, states):
+        cache = self.caches[player]
+        if cache is None:
+            self.stats.count('forward_passes')
+            return forward(model_idx, torch.from_numpy(states).float())
+
+        def forward_missing(rows, canonical_states):
+            self.stats.count('forward_passes')
+            return forward(model_idx[rows], torch.from_numpy(canonical_states).float()).numpy()
+
+        return torch.from_numpy(cache.evaluate(forward_missing, model_ids[model_idx], states))
+
+    def share_states(self, x_state, o_state):
+        tensors = [t for params, buffers, _ in (x_state, o_state) for t in list(params.values()) + list(buffers.values())]
+
+        if self.shared is not None and [t.shape for t in self.shared] == [t.shape for t in tensors]:
+            with torch.no_grad():
+                for shared, tensor in zip(self.shared, tensors):
+                    if shared.data_ptr() != tensor.data_ptr():
+                        shared.copy_(tensor)
+            return
+
+        # Размер популяции изменился или пул ещё не создан
+        self.close()
+        for tensor in tensors:
+            tensor.share_memory_()
+        self.shared = tensors
+        config = (self.board_size, self.win_line, self.epsilon, 1, self.cache_size, self.cache_symmetry)
+        self.pool = mp.get_context('spawn').Pool(self.workers, initializer=_init_worker,
+                                                 initargs=(config, x_state, o_state))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.shared = None
+
+    def play_stacked(self, x_forward, o_forward, pairings, generator=None, ids=None):
+        pairings = np.asarray(pairings, dtype=np.int64).reshape(-1, 2)
+        n_games = len(pairings)
+        cells = self.board_size * self.board_size
+        if ids is None:
+            ids = (np.arange(x_forward.population_size), np.arange(o_forward.population_size))
+
+        board = BatchBoard(n_games, self.board_size, self.win_line)
+        winners = np.zeros(n_games, dtype=np.int8)
+        active = np.ones(n_games, dtype=bool)
+
+        for ply in range(cells):
+            if not active.any():
+                break
+            player = 1 if ply % 2 == 0 else 2
+            forward = x_forward if player == 1 else o_forward
+            games = np.flatnonzero(active)
+            model_idx = pairings[games, player - 1]
+
+            states = board.get_states(games)
+            with self.stats.timer('forward'):
+                q_values = self.evaluate(player, forward, model_idx, ids[player - 1], states)
+            with self.stats.timer('select'):
+                actions = select_actions(q_values, torch.from_numpy(states == 0), self.epsilon, generator).numpy()
+
+            rows, cols = board.apply_moves(games, actions, player)
+            self.stats.count('moves', len(games))
+
+            with self.stats.timer('win_check'):
+                won = board.check_last_moves(games, rows, cols, player)
+            winners[games[won]] = player
+            active[games[won]] = False
+
+        self.stats.count('games', n_games)
+        return winners, board.moves, board.history
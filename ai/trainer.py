@@ -4,150 +4,419 @@ import torch.nn.functional as F
 import csv
 import os
 import random
+import json
+import time
 import numpy as np
 from collections import deque
-from .neural_net import TicTacToeNet
+from .genome import Population
 from .agents import AIAgent
-from game.game import Game
+from .tournament import Tournament
+from .game_log import GameLogWriter, MAX_CELLS
+from .schedulers import SCHEDULERS
+from .checkpoint import CheckpointWriter
+from .instrumentation import Instrumentation, generation_stats
+from .training_log import TrainingLogWriter, generation_record
+from .model_registry import ModelRegistry, model_filename
+from .search import AlphaBetaAgent, play_match
+from .solver import Solver, MAX_SOLVER_CELLS
 
 class Trainer:
-    def __init__(self, delay, board_size, win_line, population, visualize=False):
+    def __init__(self, delay, board_size, win_line, population, visualize=False, workers=1, seed=None,
+                 cache_size=0, cache_symmetry=True, record_games=True, resample_rate=0.0,
+                 scheduler='round-robin', games_budget=None, checkpoint_every=0, visualize_every=1, search_opponent=0,
+                 solver_eval=0, log_name=None, crossover='tensor'):
+        if seed is not None:
+            random.seed(seed)
+            torch.manual_seed(seed)
+        self.rng = np.random.default_rng(seed)
+
         self.delay = delay
         self.board_size = board_size
         self.win_line = win_line
         self.population_size = population
+        # Обучение всегда идёт без окна и задержек; визуализируется только одна партия раз в visualize_every поколений
         self.visualize = visualize
+        self.visualize_every = visualize_every
+        self.record_games = record_games
+        if record_games and board_size * board_size > MAX_CELLS:
+            # В журнале номер клетки занимает один байт
+            print(f"Warning: board {board_size}x{board_size} is too large for the game log, games will not be recorded")
+            self.record_games = False
+        # Имя файлов журнала обучения; у островов - своё на каждый остров
+        self.log_name = log_name or f'training_log_{board_size}x{board_size}_{win_line}_to_win'
+
+        # Результаты пар (x_id, o_id): партии элиты между собой не переигрываются
+        self.resample_rate = resample_rate
+        self.outcomes = {}
+
+        # Кто с кем играет в каждом поколении; рейтинги прошлого поколения по id моделей
+        self.scheduler_name = scheduler
+        self.scheduler = SCHEDULERS[scheduler]()
+        self.games_budget = games_budget
+        self.x_ratings = {}
+        self.o_ratings = {}
 
+        # Последнее завершённое поколение; больше нуля после восстановления из снимка
+        self.generation = 0
+        # Оценки лучших X и O последнего поколения - они сохраняются как итоговые модели
+        self.best_fitness = (None, None)
+        self.checkpoint_every = checkpoint_every
+        self.stats = Instrumentation()
+
+        # Доля размаха оценок, выше которой модель выживает; для O отбор жёстче
+        self.x_threshold = 0.7
+        self.o_threshold = 0.8
         self.mutation_rate = 0.1
         self.weak_mutation_strength = 0.01
         self.strong_mutation_strength = 0.1
         self.strong_mutation_chance = 0.05
+        if crossover not in ('tensor', 'gene'):
+            raise ValueError(f"Unknown crossover mode: {crossover}")
+        # 'tensor' - каждый тензор параметров от одного родителя, 'gene' - каждый вес отдельно
+        self.crossover_mode = crossover
 
-        self.x_models = [TicTacToeNet(self.board_size) for _ in range(self.population_size)]
-        self.o_models = [TicTacToeNet(self.board_size) for _ in range(self.population_size)]
+        self.x_population = Population(self.board_size, self.population_size)
+        self.o_population = Population(self.board_size, self.population_size)
+        self.x_models = self.x_population.models
+        self.o_models = self.o_population.models
 
         self.x_agents = [AIAgent(model, epsilon=0.05) for model in self.x_models]
         self.o_agents = [AIAgent(model, epsilon=0.05) for model in self.o_models]
 
+        # Перебор фиксированной глубины без сети - соперник постоянной силы для каждой модели
+        self.search_opponent = search_opponent
+        self.search_agents = {player: AlphaBetaAgent(win_line=self.win_line, max_depth=search_opponent)
+                              for player in (1, 2)} if search_opponent else None
+
+        # Доля оптимальных ходов лучших моделей по точному решению; только для досок до 4x4
+        self.solver_eval = solver_eval if board_size * board_size <= MAX_SOLVER_CELLS else 0
+        if solver_eval and not self.solver_eval:
+            print(f"Solver evaluation is only available for boards up to {MAX_SOLVER_CELLS} cells")
+        self.solver = None
+
+        self.tournament = Tournament(self.board_size, self.win_line, epsilon=0.05, workers=workers,
+                                     cache_size=cache_size, cache_symmetry=cache_symmetry)
+
     def set_models_to_eval(self):
         for model in self.x_models + self.o_models:
             model.eval()
 
-    def train(self, generations, games_per_generation):
+    def train(self, generations, games_per_generation, on_generation=None, save_models=True):
+        # on_generation(trainer, generation) вызывается после эволюции, например для миграции между островами
         self.set_models_to_eval()
+        if self.games_budget:
+            self.scheduler.budget = max(1, self.games_budget // games_per_generation)
         os.makedirs('data/training_logs', exist_ok=True)
-        csv_file = f'data/training_logs/training_log_{self.board_size}x{self.board_size}_{self.win_line}_to_win.csv'
+        if self.solver_eval and self.solver is None:
+            self.solver = Solver.load_or_solve(self.board_size, self.win_line)
+        # Партии пишутся в общий журнал в фоновом потоке
+        game_log = GameLogWriter('data/games') if self.record_games else None
+        checkpoints = CheckpointWriter(self.board_size, self.win_line) if self.checkpoint_every else None
+        csv_file = f'data/training_logs/{self.log_name}.csv'
+
+        # При продолжении обучения лог дописывается, строки после снимка отбрасываются
+        if self.generation and os.path.exists(csv_file):
+            with open(csv_file, newline='') as file:
+                rows = list(csv.reader(file))
+            with open(csv_file, 'w', newline='') as file:
+                csv.writer(file).writerows(rows[:1] + [row for row in rows[1:] if int(row[0]) <= self.generation])
+
+        stats_file = csv_file[:-len('.csv')] + '_stats.jsonl'
+        if self.generation and os.path.exists(stats_file):
+            with open(stats_file) as stats_log:
+                lines = [line for line in stats_log if line.strip() and json.loads(line)['generation'] <= self.generation]
+            with open(stats_file, 'w') as stats_log:
+                stats_log.writelines(lines)
+        # Распределения оценок, отбор и время по поколениям
+        training_log = TrainingLogWriter(f'data/training_logs/{self.log_name}_generations.bin', self.generation)
 
-        with open(csv_file, 'w', newline='') as file:
+        with open(csv_file, 'a' if self.generation else 'w', newline='') as file, \
+                open(stats_file, 'a' if self.generation else 'w') as stats_log:
             writer = csv.writer(file)
-            writer.writerow(['Generation', 'X Wins', 'O Wins', 'Draws'])
-
-            for generation in range(1, generations + 1):
-                x_scores = [0] * self.population_size
-                o_scores = [0] * self.population_size
-                x_wins, o_wins, draws = 0, 0, 0
-
-                for _ in range(games_per_generation):
-                    for i in range(self.population_size):
-                        for j in range(self.population_size):
-                            game = Game(self.delay, self.board_size, self.win_line, visualize=self.visualize)
-                            winner, moves = game.play(self.x_agents[i], self.o_agents[j])
-
-                            max_moves = self.board_size * self.board_size
-                            move_score = max(1, (max_moves - moves) / max_moves * 10)  # Оценка от 1 до 10
-
-                            if winner == 1:  # X wins
-                                x_scores[i] += move_score * 2  # Бонус за победу
-                                o_scores[j] -= 5  # Штраф за проигрыш
-                                x_wins += 1
-                            elif winner == 2:  # O wins
-                                o_scores[j] += move_score * 3  # Больший бонус за победу, так как это сложнее
-                                x_scores[i] -= 5  # Штраф за проигрыш
-                                o_wins += 1
-                            else:  # Draw
-                                x_scores[i] += 1  # Небольшой бонус за ничью
-                                o_scores[j] += 5  # Значительный бонус за ничью
-                                draws += 1
+            if not self.generation:
+                writer.writerow(['Generation', 'X Wins', 'O Wins', 'Draws'])
+
+            for generation in range(self.generation + 1, generations + 1):
+                generation_start = time.perf_counter()
+                x_scores = np.zeros(self.population_size)
+                o_scores = np.zeros(self.population_size)
+
+                with self.stats.timer('tournament'):
+                    pairings, winners, moves = self.play_generation(games_per_generation, game_log)
+                with self.stats.timer('scoring'):
+                    x_wins, o_wins, draws = self.score_games(pairings, winners, moves, x_scores, o_scores)
+                if self.search_agents is not None:
+                    with self.stats.timer('search_games'):
+                        search_pairings, search_winners, search_moves = self.play_search_games()
+                    self.score_games(search_pairings, search_winners, search_moves, x_scores, o_scores)
+                    pairings = np.concatenate([pairings, search_pairings])
+                    x_results, o_results = np.split(search_winners, 2)
+                    print(f"Vs search depth {self.search_opponent}: X models won {(x_results == 1).sum()}/{len(x_results)}, "
+                          f"O models won {(o_results == 2).sum()}/{len(o_results)}, "
+                          f"draws {(search_winners == 0).sum()}")
+
+                # Средняя оценка за партию, чтобы результаты разных расписаний были сравнимы
+                x_scores, o_scores = self.fitness(pairings, x_scores, o_scores)
+                self.best_fitness = (float(x_scores.max()), float(o_scores.max()))
+                self.x_ratings = dict(zip(self.x_population.ids.tolist(), x_scores))
+                self.o_ratings = dict(zip(self.o_population.ids.tolist(), o_scores))
+                self.scheduler.record(self.x_population, self.o_population, x_scores, o_scores, generation)
+
+                if self.solver is not None:
+                    with self.stats.timer('solver_eval'):
+                        x_optimal = self.solver.optimal_move_fraction(self.x_models[int(np.argmax(x_scores))], 1, self.solver_eval, seed=generation)
+                        o_optimal = self.solver.optimal_move_fraction(self.o_models[int(np.argmax(o_scores))], 2, self.solver_eval, seed=generation)
+                    print(f"Optimal moves: best X {x_optimal:.1%}, best O {o_optimal:.1%}")
+
+                if self.visualize and generation % self.visualize_every == 0:
+                    with self.stats.timer('visual_game'):
+                        self.show_game(x_scores, o_scores)
 
                 # Evolution step
-                self.evolve_population(self.x_models, x_scores)
-                self.evolve_population(self.o_models, o_scores, is_o=True)
+                with self.stats.timer('evolve'):
+                    selection = {'x': self.evolve_population(self.x_population, x_scores),
+                                 'o': self.evolve_population(self.o_population, o_scores, is_o=True)}
 
                 # Update agents with new models
                 self.x_agents = [AIAgent(model, epsilon=0.05) for model in self.x_models]
                 self.o_agents = [AIAgent(model, epsilon=0.05) for model in self.o_models]
+                if on_generation is not None:
+                    on_generation(self, generation)
 
                 print(f"Generation {generation}: X wins: {x_wins}, O wins: {o_wins}, draws: {draws}")
+                if self.tournament.cache_size:
+                    stats = self.tournament.cache_stats()
+                    print(f"Evaluation cache: {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']:.1%}")
                 writer.writerow([generation, x_wins, o_wins, draws])
+                file.flush()
+
+                self.generation = generation
+                if checkpoints is not None and (generation % self.checkpoint_every == 0 or generation == generations):
+                    with self.stats.timer('checkpoint'):
+                        checkpoints.save(self.checkpoint_state(x_scores, o_scores))
+
+                # Время фаз поколения; время процессов-исполнителей суммируется
+                self.stats.merge(self.tournament.stats.snapshot())
+                stats = generation_stats(generation, time.perf_counter() - generation_start, self.stats.snapshot())
+                stats_log.write(json.dumps(stats) + '\n')
+                stats_log.flush()
+                training_log.append(generation_record(generation, (x_wins, o_wins, draws), x_scores, o_scores, selection, stats))
+                print(f"Time: {stats['wall_time']:.2f}s, {stats['games_per_sec']:.0f} games/s, "
+                      f"{stats['forward_passes_per_sec']:.0f} forward passes/s")
+
+        training_log.close()
+        self.tournament.close()
+        if checkpoints is not None:
+            checkpoints.close()
+        if game_log is not None:
+            game_log.close()
+
+        if not save_models:
+            return
 
         # Save the best models
         os.makedirs('data/saved_models', exist_ok=True)
-        torch.save(self.x_models[0].state_dict(), f'data/saved_models/model_X_{self.board_size}x{self.board_size}_{self.win_line}_to_win.pth')
-        torch.save(self.o_models[0].state_dict(), f'data/saved_models/model_O_{self.board_size}x{self.board_size}_{self.win_line}_to_win.pth')
+        registry = ModelRegistry('data/saved_models')
+        for player, population, fitness in (('X', self.x_population, self.best_fitness[0]),
+                                            ('O', self.o_population, self.best_fitness[1])):
+            torch.save(population.state_dict(0), os.path.join('data/saved_models', model_filename(player, self.board_size, self.win_line)))
+            registry.register(player, self.board_size, self.win_line, self.generation, fitness)
+
+
+    def show_game(self, x_scores, o_scores):
+        # Лучшие X и O поколения играют одну партию в окне; Game и matplotlib загружаются только здесь
+        from game.game import Game
+
+        x_best, o_best = int(np.argmax(x_scores)), int(np.argmax(o_scores))
+        game = Game(self.delay, self.board_size, self.win_line, visualize=True)
+        winner, moves = game.play(self.x_agents[x_best], self.o_agents[o_best])
+        print(f"Shown game: X #{self.x_population.ids[x_best]} vs O #{self.o_population.ids[o_best]}, "
+              f"{'X wins' if winner == 1 else 'O wins' if winner == 2 else 'draw'} in {moves} moves")
+
+    def play_search_games(self):
+        # Каждая модель X и каждая модель O играет одну партию против перебора; индекс соперника вне популяции
+        opponent = self.population_size
+        pairings, winners, moves = [], [], []
+        for i, agent in enumerate(self.x_agents):
+            winner, n_moves = play_match(agent, self.search_agents[2], self.board_size, self.win_line)
+            pairings.append((i, opponent))
+            winners.append(winner)
+            moves.append(n_moves)
+        for j, agent in enumerate(self.o_agents):
+            winner, n_moves = play_match(self.search_agents[1], agent, self.board_size, self.win_line)
+            pairings.append((opponent, j))
+            winners.append(winner)
+            moves.append(n_moves)
+        self.stats.count('games', len(pairings))
+        return np.array(pairings), np.array(winners), np.array(moves)
 
+    def checkpoint_state(self, x_scores, o_scores):
+        # Полный снимок: геномы, id, оценки, кэш результатов и состояния генераторов случайных чисел
+        return {
+            'generation': self.generation,
+            'board_size': self.board_size,
+            'win_line': self.win_line,
+            'population_size': self.population_size,
+            'x_genomes': self.x_population.genomes.clone(),
+            'o_genomes': self.o_population.genomes.clone(),
+            'x_ids': self.x_population.ids.copy(),
+            'o_ids': self.o_population.ids.copy(),
+            'next_ids': (self.x_population.next_id, self.o_population.next_id),
+            'x_scores': np.array(x_scores),
+            'o_scores': np.array(o_scores),
+            'x_ratings': dict(self.x_ratings),
+            'o_ratings': dict(self.o_ratings),
+            'outcomes': dict(self.outcomes),
+            'scheduler_name': self.scheduler_name,
+            'scheduler': self.scheduler.state_dict(),
+            'python_rng': random.getstate(),
+            'numpy_rng': self.rng.bit_generator.state,
+            'torch_rng': torch.get_rng_state(),
+        }
 
-    def evolve_population(self, models, scores, is_o=False):
+    def load_checkpoint_state(self, state):
+        if (state['board_size'], state['win_line'], state['population_size']) != (self.board_size, self.win_line, self.population_size):
+            raise ValueError(f"Checkpoint is for a {state['board_size']}x{state['board_size']} board, "
+                             f"{state['win_line']} to win, population {state['population_size']}")
+        # В старых контрольных точках имени планировщика нет
+        if state.get('scheduler_name', self.scheduler_name) != self.scheduler_name:
+            raise ValueError(f"Checkpoint was written with the {state['scheduler_name']} scheduler, not {self.scheduler_name}")
+        with torch.no_grad():
+            self.x_population.genomes.copy_(state['x_genomes'])
+            self.o_population.genomes.copy_(state['o_genomes'])
+        self.x_population.ids = state['x_ids']
+        self.o_population.ids = state['o_ids']
+        self.x_population.next_id, self.o_population.next_id = state['next_ids']
+        self.x_ratings = state['x_ratings']
+        self.o_ratings = state['o_ratings']
+        self.outcomes = state['outcomes']
+        self.scheduler.load_state_dict(state['scheduler'])
+        random.setstate(state['python_rng'])
+        self.rng.bit_generator.state = state['numpy_rng']
+        torch.set_rng_state(state['torch_rng'])
+        self.generation = state['generation']
+        self.best_fitness = (float(state['x_scores'].max()), float(state['o_scores'].max()))
+
+    def play_generation(self, games_per_generation, game_log):
+        x_extra, o_extra = self.scheduler.hall_of_fame()
+        x_ids = np.concatenate([self.x_population.ids, np.array([i for i, _ in x_extra], dtype=np.int64)])
+        o_ids = np.concatenate([self.o_population.ids, np.array([i for i, _ in o_extra], dtype=np.int64)])
+        x_ratings = np.array([self.x_ratings.get(i, np.nan) for i in self.x_population.ids.tolist()])
+        o_ratings = np.array([self.o_ratings.get(i, np.nan) for i in self.o_population.ids.tolist()])
+        pairs = self.scheduler.pairings(self.population_size, x_ratings, o_ratings, self.rng)
+
+        keys = list(zip(x_ids[pairs[:, 0]].tolist(), o_ids[pairs[:, 1]].tolist()))
+        # Играются только пары с новыми моделями и случайная доля уже известных пар
+        replay = np.array([key not in self.outcomes or self.rng.random() < self.resample_rate for key in keys])
+        scheduled = pairs[replay]
+
+        if len(scheduled):
+            slots = self.scheduler.archive_size()
+            x_state = self.x_population.stacked(self.with_archive(self.x_population, x_extra, slots))
+            o_state = self.o_population.stacked(self.with_archive(self.o_population, o_extra, slots))
+
+            # Все партии поколения идут одновременно, по одному батчу на ход.
+            # Если раундов меньше, чем процессов, каждый раунд делится на части, чтобы занять все процессы;
+            # у каждой части своё зерно, поэтому при тех же seed и -j результат тот же
+            splits = min(len(scheduled), -(-self.tournament.workers // games_per_generation))
+            chunks = [part for _ in range(games_per_generation) for part in np.array_split(scheduled, splits)]
+            winners, moves, history = self.tournament.play_chunks(
+                x_state, o_state, chunks, seed=int(self.rng.integers(2 ** 63)), ids=(x_ids, o_ids))
+            if game_log is not None:
+                played = np.concatenate(chunks)
+                with self.stats.timer('game_log'):
+                    game_log.append_batch(self.board_size, self.win_line, winners, moves, history,
+                                          x_ids[played[:, 0]], o_ids[played[:, 1]])
+            winners = winners.reshape(games_per_generation, -1)
+            moves = moves.reshape(games_per_generation, -1)
+            for k, g in enumerate(np.flatnonzero(replay)):
+                self.outcomes[keys[g]] = (winners[:, k].copy(), moves[:, k].copy())
+
+        # Пары с исчезнувшими моделями больше не понадобятся
+        self.outcomes = {key: self.outcomes[key] for key in keys}
+        print(f"Played {len(scheduled) * games_per_generation} games, reused {(~replay).sum() * games_per_generation} cached results")
+
+        winners = np.stack([self.outcomes[key][0] for key in keys], axis=1).reshape(-1)
+        moves = np.stack([self.outcomes[key][1] for key in keys], axis=1).reshape(-1)
+        return np.tile(pairs, (games_per_generation, 1)), winners, moves
+
+    def with_archive(self, population, extra, slots):
+        # Строки архива дополняются нулями до его наибольшего размера: с -j форма тензоров в общей памяти
+        # не меняется по мере роста архива, и пул процессов не пересоздаётся
+        if not slots:
+            return None
+        padding = population.genomes.new_zeros(slots - len(extra), population.genomes.shape[1])
+        return torch.cat([population.genomes] + [g[None] for _, g in extra] + [padding])
+
+    def score_games(self, pairings, winners, moves, x_scores, o_scores):
+        pairings = np.asarray(pairings).reshape(-1, 2)
+        winners = np.asarray(winners)
+        max_moves = self.board_size * self.board_size
+        move_score = np.maximum(1, (max_moves - np.asarray(moves)) / max_moves * 10)  # Оценка от 1 до 10
+
+        x_won, o_won = winners == 1, winners == 2
+        # X: бонус за победу, штраф за проигрыш, небольшой бонус за ничью
+        x_delta = np.select([x_won, o_won], [move_score * 2, -5], 1)
+        # O: больший бонус за победу, так как это сложнее, и значительный бонус за ничью
+        o_delta = np.select([o_won, x_won], [move_score * 3, -5], 5)
+
+        # Соперники из зала славы не входят в популяцию и оценок не получают
+        x_own = pairings[:, 0] < len(x_scores)
+        o_own = pairings[:, 1] < len(o_scores)
+        np.add.at(x_scores, pairings[x_own, 0], x_delta[x_own])
+        np.add.at(o_scores, pairings[o_own, 1], o_delta[o_own])
+        return int(x_won.sum()), int(o_won.sum()), int((~x_won & ~o_won).sum())
+
+    def fitness(self, pairings, x_scores, o_scores):
+        x_games = np.bincount(pairings[:, 0], minlength=self.population_size)[:self.population_size]
+        o_games = np.bincount(pairings[:, 1], minlength=self.population_size)[:self.population_size]
+        return x_scores / np.maximum(x_games, 1), o_scores / np.maximum(o_games, 1)
+
+    def evolve_population(self, population, scores, is_o=False):
+        scores = torch.tensor(scores, dtype=torch.float64)
         # Sort models by their scores in descending order
-        sorted_models_scores = sorted(zip(models, scores), key=lambda x: x[1], reverse=True)
+        order = torch.argsort(scores, descending=True, stable=True)
 
         # Calculate min and max scores
-        min_score = sorted_models_scores[-1][1]
-        max_score = sorted_models_scores[0][1]
+        min_score = scores[order[-1]].item()
+        max_score = scores[order[0]].item()
 
         # Calculate the adaptive threshold
-        if is_o:
-            threshold_percentage = 0.8  # Более жесткий отбор для O
-        else:
-            threshold_percentage = 0.7  # Для X оставляем как было
+        threshold_percentage = self.o_threshold if is_o else self.x_threshold
 
         score_threshold = min_score + (max_score - min_score) * threshold_percentage
-        # Keep all models above the threshold
-        top_performers = [model for model, score in sorted_models_scores if score >= score_threshold]
-
-        # If we have less than 2 top performers, keep at least the top 2
-        if len(top_performers) < 2:
-            top_performers = [model for model, _ in sorted_models_scores[:2]]
-
-        new_models = []
-
-        # Keep the top performers
-        new_models.extend(top_performers)
+        # Keep all models above the threshold, but at least the top 2
+        top_count = max(2, int((scores >= score_threshold).sum()))
+        top_performers = order[:top_count]
 
         # Fill the rest of the population with offspring of top performers
-        while len(new_models) < self.population_size:
-            parent1, parent2 = random.sample(top_performers, 2)
-            child = self.crossover(parent1, parent2)
-            self.mutate(child)
-            new_models.append(child)
+        children_count = self.population_size - top_count
+        parents = top_performers[torch.rand(children_count, top_count).argsort(dim=1)[:, :2]]
+        children = self.crossover(population, population.genomes[parents[:, 0]], population.genomes[parents[:, 1]])
+        self.mutate(population, children)
 
-        # Update the population
-        models[:] = new_models
+        # Update the population: models are views into the genome tensor
+        with torch.no_grad():
+            population.genomes.copy_(torch.cat([population.genomes[top_performers], children]))
+        population.ids = np.concatenate([population.ids[top_performers.numpy()], population.new_ids(children_count)])
 
         # Print some information about the selection process
         print(f"{'O' if is_o else 'X'} Selection: Min score: {min_score:.2f}, Max score: {max_score:.2f}, Threshold: {score_threshold:.2f}")
-        print(f"Selected {len(top_performers)} out of {self.population_size} models")
-
-
-    def crossover(self, parent1, parent2):
-        child = TicTacToeNet(self.board_size)
-        child_state_dict = child.state_dict()
-        p1_state_dict = parent1.state_dict()
-        p2_state_dict = parent2.state_dict()
+        print(f"Selected {top_count} out of {self.population_size} models")
+        return top_count, score_threshold
 
-        for key in child_state_dict:
-            if random.random() < 0.5:
-                child_state_dict[key] = p1_state_dict[key]
-            else:
-                child_state_dict[key] = p2_state_dict[key]
 
-        child.load_state_dict(child_state_dict)
-        return child
+    def crossover(self, population, parents1, parents2):
+        if self.crossover_mode == 'gene':
+            take_first = torch.rand(parents1.shape) < 0.5
+        else:
+            # Каждый тензор параметров целиком берётся от одного из родителей
+            take_first = population.expand_segments(torch.rand(len(parents1), len(population.layout)) < 0.5)
+        return torch.where(take_first, parents1, parents2)
 
-    def mutate(self, model):
-        with torch.no_grad():
-            for param in model.parameters():
-                if random.random() < self.mutation_rate:
-                    if random.random() < self.strong_mutation_chance:
-                        param += torch.randn(param.size()) * self.strong_mutation_strength
-                    else:
-                        param += torch.randn(param.size()) * self.weak_mutation_strength
+    def mutate(self, population, children):
+        segments = (len(children), len(population.layout))
+        mutated = torch.rand(segments) < self.mutation_rate
+        strong = torch.rand(segments) < self.strong_mutation_chance
+        strength = torch.where(strong, self.strong_mutation_strength, self.weak_mutation_strength) * mutated
+        children += torch.randn(children.shape) * population.expand_segments(strength)
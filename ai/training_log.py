@@ -0,0 +1,90 @@
+import os
+import time
+import numpy as np
+
+# Одна запись фиксированного размера на поколение: файл читается как структурированный массив
+# (столбец - поле) и дочитывается с конца без разбора уже прочитанных записей
+QUANTILES = (('min', 0.0), ('p25', 0.25), ('median', 0.5), ('p75', 0.75), ('max', 1.0))
+PHASES = ('tournament', 'scoring', 'evolve', 'checkpoint')
+GENERATION_DTYPE = np.dtype(
+    [('generation', '<u4'), ('x_wins', '<u4'), ('o_wins', '<u4'), ('draws', '<u4'), ('games', '<u4')]
+    + [(f'{side}_{name}', '<f4') for side in 'xo' for name in [q for q, _ in QUANTILES] + ['mean', 'std', 'threshold']]
+    + [('x_selected', '<u2'), ('o_selected', '<u2')]
+    + [('wall_time', '<f4'), ('games_per_sec', '<f4'), ('forward_passes_per_sec', '<f4')]
+    + [(f'{phase}_time', '<f4') for phase in PHASES])
+
+
+def generation_record(generation, results, x_scores, o_scores, selection, stats):
+    # results: (x_wins, o_wins, draws); selection: {'x': (отобрано, порог), 'o': ...}; stats - из generation_stats
+    record = np.zeros((), dtype=GENERATION_DTYPE)
+    record['generation'] = generation
+    record['x_wins'], record['o_wins'], record['draws'] = results
+    record['games'] = sum(results)
+    for side, scores in (('x', x_scores), ('o', o_scores)):
+        values = np.quantile(scores, [q for _, q in QUANTILES])
+        for (name, _), value in zip(QUANTILES, values):
+            record[f'{side}_{name}'] = value
+        record[f'{side}_mean'] = np.mean(scores)
+        record[f'{side}_std'] = np.std(scores)
+        record[f'{side}_selected'], record[f'{side}_threshold'] = selection[side]
+    record['wall_time'] = stats['wall_time']
+    record['games_per_sec'] = stats['games_per_sec']
+    record['forward_passes_per_sec'] = stats['forward_passes_per_sec']
+    for phase in PHASES:
+        record[f'{phase}_time'] = stats['timers'].get(phase, 0.0)
+    return record
+
+
+class TrainingLogWriter:
+    # Записи копятся в памяти и сбрасываются на диск каждые flush_every поколений или flush_seconds секунд
+    def __init__(self, path, generation=0, flush_every=10, flush_seconds=5.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if generation and os.path.exists(path):
+            # При продолжении обучения записи после снимка отбрасываются
+            kept = int((TrainingLog(path).read_new()['generation'] <= generation).sum())
+            os.truncate(path, kept * GENERATION_DTYPE.itemsize)
+        self.file = open(path, 'ab' if generation else 'wb')
+        self.rows = []
+        self.last_flush = time.monotonic()
+
+    def append(self, record):
+        self.rows.append(record)
+        if len(self.rows) >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.file.write(np.stack(self.rows).tobytes())
+            self.file.flush()
+            self.rows = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class TrainingLog:
+    # Читатель, который при каждом вызове read_new дочитывает только новые целые записи
+    def __init__(self, path):
+        self.path = path
+        self.records = np.zeros(0, dtype=GENERATION_DTYPE)
+
+    def read_new(self):
+        count = os.path.getsize(self.path) // GENERATION_DTYPE.itemsize
+        if count < len(self.records):
+            # Файл начат заново: читаем с начала
+            self.records = np.zeros(0, dtype=GENERATION_DTYPE)
+        new = np.fromfile(self.path, dtype=GENERATION_DTYPE, count=count - len(self.records),
+                          offset=len(self.records) * GENERATION_DTYPE.itemsize)
+        self.records = np.concatenate([self.records, new])
+        return new
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, column):
+        return self.records[column]
@@ -0,0 +1,232 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import time
+import numpy as np
+import torch
+
+from ai.neural_net import TicTacToeNet
+from ai.agents import AIAgent
+from ai.batch_board import BatchBoard
+from ai.genome import Population
+from ai.inference import compile_model
+from ai.tournament import Tournament, round_robin
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def measure(function, repeat):
+    # Медиана по нескольким запускам после одного прогревочного
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def result(name, params, value, unit, higher_is_better):
+    return {'name': name, 'params': params, 'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def bench_game_play(args):
+    results = []
+    for board_size, win_line in ((3, 3), (5, 4), (7, 5)):
+        population = args.population
+        models = [TicTacToeNet(board_size).eval() for _ in range(population)]
+        pairings = round_robin(population, population)
+        tournament = Tournament(board_size, win_line)
+        generator = torch.Generator().manual_seed(args.seed)
+        seconds = measure(lambda: tournament.play(models, models, pairings, generator), args.repeat)
+        results.append(result('tournament_games', {'board_size': board_size, 'win_line': win_line, 'population': population},
+                              len(pairings) / seconds, 'games/s', True))
+
+        try:
+            from game.game import Game
+        except ImportError:
+            continue
+        agents = [AIAgent(model, epsilon=0.05) for model in models[:2]]
+        games = 20
+
+        def play_games():
+            for _ in range(games):
+                Game(0, board_size, win_line, visualize=False).play(agents[0], agents[1])
+
+        results.append(result('game_play', {'board_size': board_size, 'win_line': win_line},
+                              games / measure(play_games, args.repeat), 'games/s', True))
+    return results
+
+
+def bench_forward(args):
+    results = []
+    for board_size in (3, 7, 15):
+        model = TicTacToeNet(board_size).eval()
+        cells = board_size * board_size
+        single = torch.zeros(1, cells)
+        batch = torch.randint(0, 3, (args.batch, cells)).float()
+        calls = 200
+
+        def run_single():
+            with torch.no_grad():
+                for _ in range(calls):
+                    model(single)
+
+        def run_batched():
+            with torch.no_grad():
+                model(batch)
+
+        results.append(result('forward_single', {'board_size': board_size},
+                              measure(run_single, args.repeat) / calls * 1e6, 'us/board', False))
+        results.append(result('forward_batched', {'board_size': board_size, 'batch': args.batch},
+                              measure(run_batched, args.repeat) / args.batch * 1e6, 'us/board', False))
+
+        for backend in ('numpy', 'jit', 'int8', 'float16', 'bfloat16'):
+            net = compile_model(model, backend)
+            state = single.numpy()
+
+            def run_compiled():
+                for _ in range(calls):
+                    net(state)
+
+            results.append(result('forward_compiled', {'board_size': board_size, 'backend': backend},
+                                  measure(run_compiled, args.repeat) / calls * 1e6, 'us/board', False))
+    return results
+
+
+def bench_check_winner(args):
+    results = []
+    rng = np.random.default_rng(args.seed)
+    n_games = args.batch
+    for board_size, win_line in ((3, 3), (5, 4), (7, 5), (10, 5), (15, 5)):
+        board = BatchBoard(n_games, board_size, win_line)
+        board.boards[:] = rng.choice([0, 1, 2], size=board.boards.shape, p=[0.5, 0.25, 0.25])
+        games = np.arange(n_games)
+        rows = rng.integers(0, board_size, n_games)
+        cols = rng.integers(0, board_size, n_games)
+        params = {'board_size': board_size, 'win_line': win_line}
+
+        results.append(result('check_winners_full', params,
+                              measure(board.check_winners, args.repeat) / n_games * 1e6, 'us/board', False))
+        results.append(result('check_last_moves', params,
+                              measure(lambda: board.check_last_moves(games, rows, cols, 1), args.repeat) / n_games * 1e6,
+                              'us/board', False))
+
+        try:
+            from game.board import Board
+        except ImportError:
+            continue
+        boards = []
+        for g in range(50):
+            single = Board(board_size, win_line)
+            single.board = board.boards[g].astype(int)
+            boards.append(single)
+        results.append(result('board_check_winner', params,
+                              measure(lambda: [b.check_winner() for b in boards], args.repeat) / len(boards) * 1e6,
+                              'us/board', False))
+    return results
+
+
+def bench_evolve(args):
+    from ai.trainer import Trainer
+
+    results = []
+    for population in (10, 30, 100):
+        trainer = Trainer(0, 3, 3, population, seed=args.seed, record_games=False)
+        scores = np.random.default_rng(args.seed).normal(size=population)
+        populations = [Population(3, population) for _ in range(args.repeat + 1)]
+        runs = iter(populations)
+
+        def evolve():
+            # Отчёт о селекции в консоль не нужен
+            with contextlib.redirect_stdout(io.StringIO()):
+                trainer.evolve_population(next(runs), scores)
+
+        results.append(result('evolve_population', {'population': population},
+                              measure(evolve, args.repeat) * 1e3, 'ms', False))
+    return results
+
+
+BENCHMARKS = {
+    'game_play': bench_game_play,
+    'forward': bench_forward,
+    'check_winner': bench_check_winner,
+    'evolve': bench_evolve,
+}
+
+
+def key(entry):
+    return entry['name'] + json.dumps(entry['params'], sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    # Возвращает список регрессий хуже допуска
+    previous = {key(entry): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        old = previous.get(key(entry))
+        if old is None:
+            continue
+        change = (entry['value'] - old['value']) / old['value']
+        worse = -change if entry['higher_is_better'] else change
+        marker = 'REGRESSION' if worse > tolerance else ''
+        print(f"{entry['name']:<22} {json.dumps(entry['params']):<50} {old['value']:>12.2f} -> {entry['value']:>12.2f} {entry['unit']:<8} {change:+.1%} {marker}")
+        if worse > tolerance:
+            regressions.append(entry)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the game engine, inference and evolution hot paths")
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per measurement (default: 5)")
+    parser.add_argument("--population", type=int, default=10, help="Population size for tournament games (default: 10)")
+    parser.add_argument("--batch", type=int, default=256, help="Batch size for batched measurements (default: 256)")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a saved JSON result file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown before a result counts as a regression (default: 0.1)")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    torch.set_num_threads(1)
+    results = []
+    for name in args.benchmarks or BENCHMARKS:
+        seed_everything(args.seed)
+        print(f"Running {name}...")
+        results.extend(BENCHMARKS[name](args))
+
+    report = {
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    for entry in results:
+        print(f"{entry['name']:<22} {json.dumps(entry['params']):<50} {entry['value']:>12.2f} {entry['unit']}")
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        print(f"\nComparison with {args.baseline}:")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
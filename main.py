@@ -1,11 +1,12 @@
 import argparse
-from game.game import Game
+import numpy as np
 from ai.trainer import Trainer
-from replay import Replay
+from ai.checkpoint import latest_checkpoint, load_checkpoint
+from ai.instrumentation import run_profiled
 
 def main():
     parser = argparse.ArgumentParser(description="Tic Tac Toe AI - Train AI models or replay saved games")
-    parser.add_argument("-m", "--mode", choices=["train", "replay"], default="train", help="Mode: train AI or replay a game (default: train)")
+    parser.add_argument("-m", "--mode", choices=["train", "selfplay-dqn", "replay", "solve", "quantize"], default="train", help="Mode: train AI by evolution or by self-play DQN, replay a game, solve a small board exactly or export reduced-precision models (default: train)")
 
     parser.add_argument("-g", "--generations", type=int, default=100, help="Number of training generations (default: 100)")
     parser.add_argument("-p", "--population", type=int, default=10, help="Population of generation (default: 10)")
@@ -13,21 +14,123 @@ def main():
     parser.add_argument("-b", "--board-size", type=int, default=3, help="Size of the board (default: 3)")
     parser.add_argument("-w", "--win-line", type=int, default=3, help="Win line's length (default: 3)")
     
-    parser.add_argument("-v", "--visualize", action="store_true", help="Visualize the game board")
-    parser.add_argument("-d", "--move-delay", type=float, default=0.001, help="Delay between moves in seconds (default: 0.001)")
+    parser.add_argument("-v", "--visualize", action="store_true", help="Show one game between the best X and O models in a window")
+    parser.add_argument("--visualize-every", type=int, default=1, help="With -v, show a game every N generations (default: 1)")
+    parser.add_argument("-d", "--move-delay", type=float, default=0.001, help="Delay between moves of shown and replayed games in seconds (default: 0.001)")
+
+    parser.add_argument("-j", "--workers", type=int, default=1, help="Worker processes for tournament games (default: 1)")
+    parser.add_argument("-s", "--seed", type=int, help="Random seed for reproducible training")
+
+    parser.add_argument("--eval-cache", type=int, default=0, help="Size of the per-model evaluation cache, 0 disables it (default: 0)")
+    parser.add_argument("--exact-cache", action="store_true", help="Key the evaluation cache by exact boards instead of symmetry classes")
+
+    parser.add_argument("--resample-rate", type=float, default=0.0, help="Share of already played pairings to replay each generation (default: 0.0)")
+    parser.add_argument("--scheduler", choices=["round-robin", "swiss", "random", "hall-of-fame"], default="round-robin", help="How opponents are paired each generation (default: round-robin)")
+    parser.add_argument("--games-budget", type=int, help="Games per generation for the swiss, random and hall-of-fame schedulers")
+    parser.add_argument("--checkpoint-every", type=int, help="Save a full population checkpoint every N generations, 0 disables (default: 10)")
+    parser.add_argument("--resume", nargs="?", const="latest", help="Resume training from a checkpoint file (default: the latest one for this board)")
+    parser.add_argument("--profile", choices=["cprofile", "torch"], help="Write a cProfile or torch.profiler trace of the training run to data/profiles")
+    parser.add_argument("--search-opponent", type=int, default=0, help="Each model also plays an alpha-beta search of this depth every generation, 0 disables (default: 0)")
+    parser.add_argument("--solver-eval", type=int, default=0, help="Check this many positions against the exact solution every generation (boards up to 4x4), 0 disables (default: 0)")
+    parser.add_argument("--crossover", choices=["tensor", "gene"], default="tensor", help="Crossover takes whole parameter tensors or single weights from either parent (default: tensor)")
+    parser.add_argument("--no-record", action="store_true", help="Do not write training games to the game log")
+    parser.add_argument("--islands", type=int, default=1, help="Evolve this many populations in parallel processes with migration between them (default: 1)")
+    parser.add_argument("--migrate-every", type=int, default=10, help="With --islands, send the best models to the next island every N generations (default: 10)")
+    parser.add_argument("--migrants", type=int, default=2, help="With --islands, how many of the best X and O models migrate (default: 2)")
+
+    parser.add_argument("--dqn-games", type=int, default=64, help="Self-play games per DQN iteration (default: 64)")
+    parser.add_argument("--buffer-size", type=int, default=100000, help="Transitions kept in the DQN replay buffer (default: 100000)")
+    parser.add_argument("--lr", type=float, default=1e-3, help="DQN learning rate (default: 0.001)")
+
+    parser.add_argument("--precisions", nargs="*", help="Reduced precisions to export with -m quantize: int8, float16, bfloat16 (default: all)")
+    parser.add_argument("--eval-games", type=int, default=1000, help="Games per comparison with the float32 models in -m quantize (default: 1000)")
 
     parser.add_argument("-n", "--number", type=int, help="Game number to replay")
+    parser.add_argument("--gif", help="Render the replayed game to a GIF file instead of opening a window")
     args = parser.parse_args()
 
-    if args.mode == "train":
-        trainer = Trainer(delay=args.move_delay, board_size=args.board_size, win_line=args.win_line, population=args.population, visualize=args.visualize)
-        trainer.train(args.generations, args.rounds_gen)
+    if args.mode == "train" and args.islands > 1:
+        from ai.islands import train_islands
+
+        # Каждый остров - отдельный процесс без окна, пула процессов и контрольных точек
+        unsupported = [flag for flag, used in (("--workers", args.workers > 1), ("--checkpoint-every", args.checkpoint_every), ("--resume", args.resume), ("--visualize", args.visualize), ("--profile", args.profile)) if used]
+        if unsupported:
+            parser.error(f"--islands cannot be combined with {', '.join(unsupported)}")
+        if not args.no_record:
+            print("Games are not recorded to the game log with --islands")
+        train_islands(args.islands, args.board_size, args.win_line, args.population, args.generations, args.rounds_gen, migrate_every=args.migrate_every, migrants=args.migrants, seed=args.seed, scheduler=args.scheduler, games_budget=args.games_budget, cache_size=args.eval_cache, cache_symmetry=not args.exact_cache, resample_rate=args.resample_rate, search_opponent=args.search_opponent, solver_eval=args.solver_eval, crossover=args.crossover)
+    elif args.mode == "train":
+        trainer = Trainer(delay=args.move_delay, board_size=args.board_size, win_line=args.win_line, population=args.population, visualize=args.visualize, workers=args.workers, seed=args.seed, cache_size=args.eval_cache, cache_symmetry=not args.exact_cache, record_games=not args.no_record, resample_rate=args.resample_rate, scheduler=args.scheduler, games_budget=args.games_budget, checkpoint_every=10 if args.checkpoint_every is None else args.checkpoint_every, visualize_every=args.visualize_every, search_opponent=args.search_opponent, solver_eval=args.solver_eval, crossover=args.crossover)
+        if args.resume:
+            path = latest_checkpoint(args.board_size, args.win_line) if args.resume == "latest" else args.resume
+            if path is None:
+                print("No checkpoint found to resume from")
+                return
+            trainer.load_checkpoint_state(load_checkpoint(path))
+            print(f"Resumed from {path} at generation {trainer.generation}")
+        if args.profile:
+            path = f"data/profiles/train_{args.board_size}x{args.board_size}_{args.win_line}_to_win"
+            run_profiled(lambda: trainer.train(args.generations, args.rounds_gen), args.profile, path)
+        else:
+            trainer.train(args.generations, args.rounds_gen)
+    elif args.mode == "selfplay-dqn":
+        from ai.dqn import DQNTrainer
+
+        trainer = DQNTrainer(args.board_size, args.win_line, games_per_batch=args.dqn_games, buffer_size=args.buffer_size, lr=args.lr, seed=args.seed)
+        trainer.train(args.generations)
     elif args.mode == "replay":
         if not args.number:
             print("Please specify a game number to replay with -n or --number")
             return
+        from replay import Replay
+
         replay = Replay(args.number, delay=args.move_delay, board_size=args.board_size, win_line=args.win_line)
-        replay.start()
+        if args.gif:
+            replay.save_gif(args.gif)
+        else:
+            replay.start()
+    elif args.mode == "solve":
+        solve(args.board_size, args.win_line)
+    elif args.mode == "quantize":
+        quantize(args.board_size, args.win_line, args.precisions, args.eval_games)
+
+def solve(board_size, win_line):
+    # Точное решение доски сохраняется в data/solver; сохранённые модели сверяются с ним
+    from ai.solver import Solver, table_path
+    from ai.model_registry import ModelRegistry
+
+    solver = Solver.load_or_solve(board_size, win_line)
+    value = int(solver.lookup(np.zeros((1, board_size * board_size), dtype=np.int8))[0])
+    outcome = "X wins" if value > 0 else "O wins" if value < 0 else "draw"
+    print(f"{board_size}x{board_size}, {win_line} to win: {outcome} with perfect play, "
+          f"{len(solver.keys)} positions in {table_path(board_size, win_line)}")
+
+    registry = ModelRegistry('data/saved_models').scan()
+    for player, side in (('X', 1), ('O', 2)):
+        try:
+            model = registry.load(player, board_size, win_line)
+        except FileNotFoundError:
+            continue
+        print(f"Saved {player} model plays the optimal move in {solver.optimal_move_fraction(model, side):.1%} of positions")
+
+def quantize(board_size, win_line, precisions, games):
+    # Сохранённые модели экспортируются в пониженной точности и сравниваются с исходными float32
+    from ai.inference import PRECISIONS
+    from ai.model_registry import ModelRegistry
+    from ai.quantize import evaluate_precisions, print_report
+
+    unknown = [name for name in precisions or [] if name not in PRECISIONS]
+    if unknown:
+        print(f"Unknown precisions: {', '.join(unknown)}; available: {', '.join(PRECISIONS)}")
+        return
+    try:
+        x_model, o_model = ModelRegistry('data/saved_models').scan().load_pair(board_size, win_line)
+    except FileNotFoundError:
+        print(f"No saved models for {board_size}x{board_size}, {win_line} to win")
+        return
+    rows = evaluate_precisions(x_model, o_model, board_size, win_line, precisions or PRECISIONS, games)
+    print_report(rows)
+    print("Exported models are in data/saved_models/quantized")
 
 if __name__ == "__main__":
     main()
@@ -1,31 +1,14 @@
 import sys
-import os
 import torch
 import numpy as np
+import threading
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QMessageBox, QComboBox
 
-from ai.neural_net import TicTacToeNet
-
-
-def get_available_models():
-    models_dir = 'data/saved_models'
-    models = []
-    for filename in os.listdir(models_dir):
-        if filename.startswith('model_') and filename.endswith('_to_win.pth'):
-            parts = filename[6:-11].split('x')
-            if len(parts) == 2:
-                # Проверяем, начинается ли первая часть с 'X_' или 'O_'
-                if parts[0].startswith(('X_', 'O_')):
-                    board_size = parts[0][2:]  # Убираем 'X_' или 'O_'
-                else:
-                    board_size = parts[0]
-                win_line = parts[1].split('_')[0]
-                try:
-                    models.append((int(board_size), int(win_line)))
-                except ValueError:
-                    # Пропускаем файлы с некорректным форматом
-                    continue
-    return sorted(set(models))
+from ai.agents import select_actions
+from ai.inference import compile_model
+from ai.model_registry import ModelRegistry
+from ai.search import AlphaBetaAgent
 
 
 class GameBoard:
@@ -37,9 +20,23 @@ class GameBoard:
     def make_move(self, x, y, player):
         if self.board[x, y] == 0:
             self.board[x, y] = player
-            return True, self.check_winner()
+            return True, self.check_last_move(x, y)
         return False, None
 
+    def check_last_move(self, x, y):
+        # Достаточно проверить линии, проходящие через последний ход
+        player = self.board[x, y]
+        for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+            count = 1
+            for sign in (1, -1):
+                i, j = x + sign * dx, y + sign * dy
+                while 0 <= i < self.size and 0 <= j < self.size and self.board[i, j] == player:
+                    count += 1
+                    i, j = i + sign * dx, j + sign * dy
+            if count >= self.win_line:
+                return player
+        return None
+
     def check_winner(self):
         for i in range(self.size):
             for j in range(self.size):
@@ -63,21 +60,59 @@ class GameBoard:
     def is_full(self):
         return np.all(self.board != 0)
 
+    def copy(self):
+        board = GameBoard(self.size, self.win_line)
+        board.board = self.board.copy()
+        return board
+
     def get_valid_moves(self):
         return [(i, j) for i in range(self.size) for j in range(self.size) if self.board[i, j] == 0]
 
 
 class GameAIAgent:
-    def __init__(self, model):
+    def __init__(self, model, search_time=None):
         self.model = model
+        self.net = compile_model(model)
+        # С search_time ход выбирается перебором, сеть только оценивает позиции
+        self.search = AlphaBetaAgent(model, time_limit=search_time) if search_time else None
+
+    def get_action(self, board, stop=None):
+        if self.search is not None:
+            return divmod(self.search.get_action(board, stop), board.size)
+        state = board.board.reshape(1, -1)
+        q_values = self.net(state)
+        action = select_actions(q_values, torch.from_numpy(state == 0))[0].item()
+        return divmod(action, board.size)
+
+
+class MoveSignals(QObject):
+    # token - номер партии, для которой считался ход
+    finished = pyqtSignal(int, int, int)
+    failed = pyqtSignal(int, str)
+
+
+class AIMoveTask(QRunnable):
+    # Ход AI считается в пуле потоков на копии доски, результат приходит в главный поток через сигнал
+    def __init__(self, agent, board, token):
+        super().__init__()
+        self.agent = agent
+        self.board = board
+        self.token = token
+        self.cancelled = threading.Event()
+        self.signals = MoveSignals()
 
-    def get_action(self, board):
-        state = torch.FloatTensor(board.board).unsqueeze(0)
-        with torch.no_grad():
-            q_values = self.model(state)
-        valid_moves = board.get_valid_moves()
-        valid_q_values = [q_values[0][i * board.size + j] for i, j in valid_moves]
-        return valid_moves[np.argmax(valid_q_values)]
+    def run(self):
+        try:
+            x, y = self.agent.get_action(self.board, self.cancelled)
+        except Exception as error:
+            if not self.cancelled.is_set():
+                self.signals.failed.emit(self.token, str(error))
+            return
+        if not self.cancelled.is_set():
+            self.signals.finished.emit(self.token, x, y)
+
+    def cancel(self):
+        self.cancelled.set()
 
 
 class TicTacToeGame(QWidget):
@@ -89,7 +124,14 @@ class TicTacToeGame(QWidget):
         self.ai_agent = None
         self.human_first = True
         self.buttons = []
-        self.available_models = get_available_models()
+        # Ходы AI не блокируют интерфейс; результаты устаревших партий отбрасываются по game_token
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(1)
+        self.game_token = 0
+        self.ai_task = None
+        # Индекс моделей читается без загрузки весов; веса выбранного режима грузятся в фоне
+        self.registry = ModelRegistry('data/saved_models').scan()
+        self.available_models = self.registry.modes()
         self.initUI()
 
     def initUI(self):
@@ -99,10 +141,19 @@ class TicTacToeGame(QWidget):
         # Add dropdown for game mode selection
         self.mode_combo = QComboBox()
         for size, win_line in self.available_models:
-            self.mode_combo.addItem(f"{size}x{size} (Win: {win_line})")
+            self.mode_combo.addItem(f"{size}x{size} (Win: {win_line})", (size, win_line))
+        self.mode_combo.currentIndexChanged.connect(self.preload_mode)
         layout.addWidget(QLabel('Select game mode:'))
         layout.addWidget(self.mode_combo)
 
+        # Network - мгновенный ход по Q-значениям, Search - перебор с сетью в качестве оценки
+        self.agent_combo = QComboBox()
+        self.agent_combo.addItem('Network', None)
+        self.agent_combo.addItem('Search (1 s per move)', 1.0)
+        self.agent_combo.addItem('Search (5 s per move)', 5.0)
+        layout.addWidget(QLabel('Select AI:'))
+        layout.addWidget(self.agent_combo)
+
         # Add button to start game
         start_button = QPushButton('Start Game')
         start_button.clicked.connect(self.setup_game)
@@ -116,31 +167,29 @@ class TicTacToeGame(QWidget):
         layout.addLayout(self.game_layout)
 
         self.setLayout(layout)
+        self.preload_mode()
         self.show()
 
+    def preload_mode(self):
+        if self.mode_combo.currentData() is not None:
+            self.registry.preload(*self.mode_combo.currentData())
+
     def setup_game(self):
+        self.cancel_ai_move()
         # Clear previous game if exists
         for i in reversed(range(self.game_layout.count())): 
             self.game_layout.itemAt(i).widget().setParent(None)
 
-        selected_mode = self.mode_combo.currentText()
-        board_size = int(selected_mode.split('x')[0])
-        win_line = int(selected_mode.split('(Win: ')[1].split(')')[0])
+        if self.mode_combo.currentData() is None:
+            return
+        board_size, win_line = self.mode_combo.currentData()
 
         self.board = GameBoard(board_size, win_line)
-        model_x_path = f'data/saved_models/model_X_{board_size}x{board_size}_{win_line}_to_win.pth'
-        model_o_path = f'data/saved_models/model_O_{board_size}x{board_size}_{win_line}_to_win.pth'
-
         try:
-            self.model_x = TicTacToeNet(board_size)
-            self.model_x.load_state_dict(torch.load(model_x_path))
-            self.model_x.eval()
-
-            self.model_o = TicTacToeNet(board_size)
-            self.model_o.load_state_dict(torch.load(model_o_path))
-            self.model_o.eval()
-        except FileNotFoundError:
-            QMessageBox.critical(self, "Error", f"Model file not found: {model_x_path} or {model_o_path}")
+            # Обычно модели уже в кэше после фоновой загрузки
+            self.model_x, self.model_o = self.registry.preload(board_size, win_line).result()
+        except FileNotFoundError as error:
+            QMessageBox.critical(self, "Error", f"Model file not found: {error}")
             return
 
         # Create grid for the game board
@@ -171,6 +220,7 @@ class TicTacToeGame(QWidget):
         self.status_label.setText('Choose your turn:')
 
     def start_game(self, human_first):
+        self.cancel_ai_move()
         self.human_first = human_first
         self.board = GameBoard(self.board.size, self.board.win_line)
         for row in self.buttons:
@@ -181,22 +231,22 @@ class TicTacToeGame(QWidget):
 
         # Выбор соответствующей модели для AI
         if human_first:
-            self.ai_agent = GameAIAgent(self.model_o)
+            self.ai_agent = GameAIAgent(self.model_o, self.agent_combo.currentData())
         else:
-            self.ai_agent = GameAIAgent(self.model_x)
+            self.ai_agent = GameAIAgent(self.model_x, self.agent_combo.currentData())
         if not human_first:
             self.ai_move()
 
 
 
     def on_click(self, x, y):
-        if self.board is None:
+        if self.board is None or self.ai_task is not None:
             return
         if self.board.board[x, y] == 0:
             player = 1 if self.human_first else 2
             valid, winner = self.board.make_move(x, y, player)
             if valid:
-                self.update_board()
+                self.update_cell(x, y)
                 if winner:
                     self.end_game(winner)
                 elif self.board.is_full():
@@ -210,11 +260,19 @@ class TicTacToeGame(QWidget):
         if not valid_moves:
             self.end_game(0)
             return
-        x, y = self.ai_agent.get_action(self.board)
+        self.ai_task = AIMoveTask(self.ai_agent, self.board.copy(), self.game_token)
+        self.ai_task.signals.finished.connect(self.on_ai_move)
+        self.ai_task.signals.failed.connect(self.on_ai_failed)
+        self.thread_pool.start(self.ai_task)
+
+    def on_ai_move(self, token, x, y):
+        if token != self.game_token:
+            return
+        self.ai_task = None
         player = 2 if self.human_first else 1
         valid, winner = self.board.make_move(x, y, player)
         if valid:
-            self.update_board()
+            self.update_cell(x, y)
             if winner:
                 self.end_game(winner)
             elif self.board.is_full():
@@ -222,6 +280,23 @@ class TicTacToeGame(QWidget):
             else:
                 self.status_label.setText("Your turn")
 
+    def on_ai_failed(self, token, message):
+        if token != self.game_token:
+            return
+        self.ai_task = None
+        QMessageBox.critical(self, "Error", f"AI move failed: {message}")
+
+    def cancel_ai_move(self):
+        # Новая партия: ещё не начатый ход снимается с очереди, уже идущий будет проигнорирован
+        self.game_token += 1
+        if self.ai_task is not None:
+            self.ai_task.cancel()
+            self.thread_pool.clear()
+            self.ai_task = None
+
+    def update_cell(self, x, y):
+        self.buttons[x][y].setText({1: 'X', 2: 'O'}.get(int(self.board.board[x, y]), ''))
+
     def update_board(self):
         for i in range(self.board.size):
             for j in range(self.board.size):
@@ -234,6 +309,7 @@ class TicTacToeGame(QWidget):
 
 
     def end_game(self, winner):
+        self.game_token += 1
         if winner == 0:
             QMessageBox.information(self, "Game Over", "It's a draw!")
         else:
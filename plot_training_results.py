@@ -1,53 +1,108 @@
-import pandas as pd
+import argparse
 import matplotlib.pyplot as plt
 import os
 import glob
 
-def find_csv_files():
-    csv_files = glob.glob('data/training_logs/*.csv')
-    return csv_files
-
-def select_csv_file(csv_files):
-    print("Available CSV files:")
-    for i, file in enumerate(csv_files, 1):
-        print(f"{i}. {os.path.basename(file)}")
-
-    while True:
-        try:
-            choice = int(input("Enter the number of the file you want to plot: "))
-            if 1 <= choice <= len(csv_files):
-                return csv_files[choice - 1]
-            else:
-                print("Invalid choice. Please try again.")
-        except ValueError:
-            print("Invalid input. Please enter a number.")
-            
-def plot_training_results(csv_file):
-    # Read the CSV file
-    df = pd.read_csv(csv_file)
+from ai.training_log import TrainingLog
+
+def find_log_files():
+    # Сначала самые свежие
+    log_files = glob.glob('data/training_logs/*_generations.bin') + glob.glob('data/training_logs/*.csv')
+    return sorted(log_files, key=os.path.getmtime, reverse=True)
 
-    # Create the plot
+def plot_csv(csv_file):
+    # Старый формат: только победы по поколениям
+    import pandas as pd
+
+    df = pd.read_csv(csv_file)
     plt.figure(figsize=(12, 6))
     plt.plot(df['Generation'], df['X Wins'], label='X Wins', color='red')
     plt.plot(df['Generation'], df['O Wins'], label='O Wins', color='blue')
     plt.plot(df['Generation'], df['Draws'], label='Draws', color='green')
-
-    # Customize the plot
     plt.title(f'Training Results - {os.path.basename(csv_file)}')
     plt.xlabel('Generation')
     plt.ylabel('Count')
     plt.legend()
     plt.grid(True)
-
-    # Show the plot
     plt.show()
 
-if __name__ == "__main__":
-    csv_files = find_csv_files()
 
-    if not csv_files:
-        print("No CSV files found in the data/training_logs directory.")
-        exit(1)
+class TrainingPlot:
+    # Линии создаются один раз; при обновлении дочитываются только новые записи журнала
+    PANELS = (
+        ('Results', 'Games', (('x_wins', 'X Wins', 'red', '-'), ('o_wins', 'O Wins', 'blue', '-'), ('draws', 'Draws', 'green', '-'))),
+        ('Fitness (median, quartiles)', 'Score per game', (('x_median', 'X', 'red', '-'), ('x_p25', None, 'red', ':'), ('x_p75', None, 'red', ':'),
+                                                           ('o_median', 'O', 'blue', '-'), ('o_p25', None, 'blue', ':'), ('o_p75', None, 'blue', ':'))),
+        ('Selection', 'Models kept', (('x_selected', 'X', 'red', '-'), ('o_selected', 'O', 'blue', '-'))),
+        ('Time', 'Seconds', (('wall_time', 'Total', 'black', '-'), ('tournament_time', 'Tournament', 'purple', '-'), ('evolve_time', 'Evolution', 'orange', '-'))),
+    )
+
+    def __init__(self, path):
+        self.log = TrainingLog(path)
+        self.fig, axes = plt.subplots(2, 2, figsize=(14, 8), sharex=True)
+        self.fig.suptitle(f'Training Results - {os.path.basename(path)}')
+        self.axes = axes.ravel()
+        self.lines = []
+        for ax, (title, ylabel, columns) in zip(self.axes, self.PANELS):
+            for column, label, color, style in columns:
+                line, = ax.plot([], [], label=label, color=color, linestyle=style)
+                self.lines.append((column, line))
+            ax.set_title(title)
+            ax.set_ylabel(ylabel)
+            ax.grid(True)
+            ax.legend(loc='upper left')
+        for ax in self.axes[2:]:
+            ax.set_xlabel('Generation')
 
-    selected_file = select_csv_file(csv_files)
-    plot_training_results(selected_file)
\ No newline at end of file
+    def update(self):
+        if not len(self.log.read_new()):
+            return False
+        generations = self.log['generation']
+        for column, line in self.lines:
+            line.set_data(generations, self.log[column])
+        for ax in self.axes:
+            ax.relim()
+            ax.autoscale_view()
+        return True
+
+    def show(self, follow=False, interval=2.0):
+        self.update()
+        if not follow:
+            plt.show()
+            return
+        plt.ion()
+        plt.show()
+        while plt.fignum_exists(self.fig.number):
+            if self.update():
+                self.fig.canvas.draw_idle()
+            self.fig.canvas.start_event_loop(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plot training logs")
+    parser.add_argument("file", nargs="?", help="Log file to plot (default: the most recently updated one)")
+    parser.add_argument("-l", "--list", action="store_true", help="List available log files and exit")
+    parser.add_argument("-f", "--follow", action="store_true", help="Keep the plot open and add new generations as they are written")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between checks for new generations with --follow (default: 2.0)")
+    args = parser.parse_args()
+
+    log_files = find_log_files()
+    if args.list:
+        for file in log_files:
+            print(file)
+        return
+    if args.file is None:
+        if not log_files:
+            print("No training logs found in the data/training_logs directory.")
+            exit(1)
+        args.file = log_files[0]
+
+    if args.file.endswith('.csv'):
+        if args.follow:
+            print("--follow needs a *_generations.bin log")
+        plot_csv(args.file)
+    else:
+        TrainingPlot(args.file).show(args.follow, args.interval)
+
+if __name__ == "__main__":
+    main()
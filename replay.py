@@ -1,52 +1,150 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.widgets import Button
-from game.visualizer import Visualizer
-from game.board import Board
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from ai.batch_board import BatchBoard
+from ai.game_log import GameLog
+
+SYMBOLS = {0: ('', 'black'), 1: ('X', 'red'), 2: ('O', 'blue')}
+
 
 class Replay:
     def __init__(self, game, delay, board_size, win_line):
-        self.moves = np.load(f"data/games/game_{game}.npy")
-        self.visualizer = Visualizer(board_size, delay)
-        self.board = Board(board_size, win_line)
+        if GameLog.exists():
+            # Размер доски и длина линии записаны в самой партии; -b и -w нужны только старым game_N.npy
+            log = GameLog()
+            record = log.read(game)
+            board_size, win_line = record['board_size'], record['win_line']
+            self.moves = log.read_moves(game)
+        else:
+            self.moves = np.load(f"data/games/game_{game}.npy")
+        self.delay = delay
+        self.board_size = board_size
+        self.win_line = win_line
         self.current_move = 0
+        self.shown_move = None
         self.result = self.moves[0][0]  # Get the game result from the first row
-        self.board_size = board_size
+        self.states, self.winners, self.lines = self.precompute()
+
+    def precompute(self):
+        # Все позиции партии считаются один раз: states[k] - доска после хода k
+        moves = self.moves[1:]
+        n_moves = len(moves)
+        deltas = np.zeros((n_moves, self.board_size, self.board_size), dtype=np.int8)
+        deltas[np.arange(n_moves), moves[:, 0], moves[:, 1]] = moves[:, 2]
+        states = np.cumsum(deltas, axis=0, dtype=np.int8)
+
+        board = BatchBoard(1, self.board_size, self.win_line)
+        winners = np.zeros(n_moves, dtype=np.int8)
+        lines = [None] * n_moves
+        winner, line = 0, None
+        for k, (row, col, player) in enumerate(moves):
+            board.boards[0, row, col] = player
+            if not winner and board.check_last_moves(np.array([0]), np.array([row]), np.array([col]), player)[0]:
+                winner, line = player, board.winning_line(0, row, col)
+            winners[k], lines[k] = winner, line
+        return states, winners, lines
+
+    def setup_figure(self, fig):
+        self.fig = fig
+        self.shown_move = None
+        self.ax = fig.add_axes([0.05, 0.2, 0.9, 0.68])
+        size = self.board_size
+        self.ax.set_xlim(0, size)
+        self.ax.set_ylim(size, 0)
+        self.ax.set_aspect('equal')
+        self.ax.axis('off')
+        for i in range(size + 1):
+            self.ax.plot([i, i], [0, size], color='black', linewidth=1, clip_on=False)
+            self.ax.plot([0, size], [i, i], color='black', linewidth=1, clip_on=False)
+
+        # На каждую клетку - подложка и текст, чтобы перерисовывать только изменившуюся клетку
+        fontsize = max(8, 120 // size)
+        self.covers = [[self.ax.add_patch(Rectangle((col + 0.05, row + 0.05), 0.9, 0.9, facecolor='white', edgecolor='none'))
+                        for col in range(size)] for row in range(size)]
+        self.cells = [[self.ax.text(col + 0.5, row + 0.5, '', ha='center', va='center', fontsize=fontsize, fontweight='bold')
+                       for col in range(size)] for row in range(size)]
+        self.win_artist, = self.ax.plot([], [], color='green', linewidth=4)
+
+        self.title = fig.text(0.5, 0.92, self.get_title_text(len(self.states)), ha='center', va='center',
+                              family='monospace', bbox=dict(facecolor='white', edgecolor='none'))
+        self.result_text = fig.text(0.5, 0.97, self.get_result_text(),
+                                    ha='center', va='center', fontsize=12, fontweight='bold')
 
     def start(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.widgets import Button
+
         plt.ion()  # Turn on interactive mode
-        self.fig, self.ax = plt.subplots(figsize=(5, 5))  # Increased figure height
-        plt.subplots_adjust(bottom=0.2, top=0.9)  # Adjusted top margin
+        self.setup_figure(plt.figure(figsize=(5, 5)))
 
-        self.prev_button_ax = plt.axes([0.2, 0.05, 0.25, 0.075])
-        self.next_button_ax = plt.axes([0.55, 0.05, 0.25, 0.075])
+        self.prev_button_ax = self.fig.add_axes([0.2, 0.05, 0.25, 0.075])
+        self.next_button_ax = self.fig.add_axes([0.55, 0.05, 0.25, 0.075])
         self.prev_button = Button(self.prev_button_ax, 'Previous')
         self.next_button = Button(self.next_button_ax, 'Next')
 
         self.prev_button.on_clicked(self.prev_move)
         self.next_button.on_clicked(self.next_move)
 
-        # Add text for game result
-        self.result_text = self.fig.text(0.5, 0.97, self.get_result_text(), 
-                                         ha='center', va='center', fontsize=12, fontweight='bold')
-
         self.update_board()
 
         while plt.fignum_exists(self.fig.number):
-            self.fig.canvas.draw_idle()
             self.fig.canvas.start_event_loop(0.05)
 
     def update_board(self):
-        self.ax.clear()
-        move = self.moves[self.current_move + 1]  # +1 to skip the result row
-        self.board.board = np.zeros((self.board_size, self.board_size), dtype=int)
-        for m in self.moves[1:self.current_move + 2]:  # Apply all moves up to current
-            self.board.board[m[0], m[1]] = m[2]
-        result = self.board.check_winner()
-        winner, winning_line = result if result else (None, None)
-        self.visualizer.draw_board(self.board, winner, winning_line, ax=self.ax)
-        self.ax.set_title(f"Move: {self.current_move + 1}/{len(self.moves) - 1}")
-        self.fig.canvas.draw()
+        canvas = self.fig.canvas
+        previous = self.shown_move
+        self.shown_move = self.current_move
+        self.title.set_text(self.get_title_text(self.current_move + 1))
+
+        if previous is None or self.lines[previous] is not self.lines[self.current_move]:
+            # Изменилась выигрышная линия - редкий случай, рисуем всё заново
+            for row, col in np.ndindex(self.board_size, self.board_size):
+                self.set_cell(row, col)
+            self.set_win_line()
+            canvas.draw()
+            return
+
+        changed = np.argwhere(self.states[previous] != self.states[self.current_move])
+        for row, col in changed:
+            self.set_cell(row, col)
+            self.ax.draw_artist(self.covers[row][col])
+            self.ax.draw_artist(self.cells[row][col])
+            canvas.blit(self.covers[row][col].get_window_extent())
+        self.fig.draw_artist(self.title)
+        canvas.blit(self.title.get_window_extent())
+
+    def set_cell(self, row, col):
+        text, color = SYMBOLS[int(self.states[self.current_move][row, col])]
+        self.cells[row][col].set_text(text)
+        self.cells[row][col].set_color(color)
+
+    def set_win_line(self):
+        line = self.lines[self.current_move]
+        if line is None:
+            self.win_artist.set_data([], [])
+        else:
+            (r1, c1), (r2, c2) = line[0], line[-1]
+            self.win_artist.set_data([c1 + 0.5, c2 + 0.5], [r1 + 0.5, r2 + 0.5])
+
+    def render_frames(self):
+        # Пакетный режим без окна и цикла событий: по кадру на каждый ход
+        fig = Figure(figsize=(5, 5))
+        FigureCanvasAgg(fig)
+        self.setup_figure(fig)
+        frames = []
+        for move in range(len(self.states)):
+            self.current_move = move
+            self.update_board()
+            frames.append(np.asarray(fig.canvas.buffer_rgba())[..., :3].copy())
+        return frames
+
+    def save_gif(self, path):
+        from PIL import Image
+
+        images = [Image.fromarray(frame) for frame in self.render_frames()]
+        duration = max(int(self.delay * 1000), 100)
+        images[0].save(path, save_all=True, append_images=images[1:], duration=duration, loop=0)
 
     def prev_move(self, event):
         if self.current_move > 0:
@@ -54,10 +152,14 @@ class Replay:
             self.update_board()
 
     def next_move(self, event):
-        if self.current_move < len(self.moves) - 2:  # -2 because of the result row
+        if self.current_move < len(self.states) - 1:
             self.current_move += 1
             self.update_board()
 
+    def get_title_text(self, move):
+        total = len(self.states)
+        return f"Move: {move}/{total}".ljust(len(f"Move: {total}/{total}"))
+
     def get_result_text(self):
         if self.result == 1:
             return "X wins!"
@@ -65,4 +167,3 @@ class Replay:
             return "O wins!"
         else:
             return "It's a draw!"
-